@@ -1,47 +1,113 @@
 # app.py
 
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
-import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta, date
 import time
 import numpy as np # For checking NaN safely
 import requests 
 import os       
+import threading
+from collections import Counter
+from data_sources import YFinanceDataSource, InstrumentedDataSource
+from fetch_scheduler import fetch_many, default_rate_limiter, error_marker
+from history_loader import HistoryLoader, QUOTE_TAIL_DAYS, ADJUSTMENT_TOLERANCE
+from ohlcv_store import OHLCVStore
+from cache import build_default_cache
+from single_flight import SingleFlight
+from quote_stream import QuoteBroadcaster, STREAM_POLL_SECONDS
+from payload_encoding import encode_payload, compress_response
+from metrics import metrics, span, start_request_timer, record_request, PROMETHEUS_MIMETYPE
+from screener import ScreenerIndex, FUNDAMENTAL_FIELDS, DEFAULT_UNIVERSE, load_universe, list_universes, parse_where, parse_signals
+from prewarm import MarketHoursScheduler, PREWARM_ENABLED, PREWARM_INTERVAL_SECONDS, PREWARM_DETAIL_TICKERS, ist_now, seconds_until_market_open
+from dma_signals import SHORT_WINDOW, LONG_WINDOW, SIGNAL_LABELS, SIG_NA_DATA, compute_dma_signals, IncrementalDMA
 
 app = Flask(__name__)
 CORS(app)
+app.before_request(start_request_timer)
+app.after_request(record_request) # Latency histograms and Server-Timing, see metrics.py (runs after compression)
+app.after_request(compress_response) # gzip/brotli per Accept-Encoding, see payload_encoding.py
 
-# --- Cache Configuration ---
-stock_detail_cache = {}
-CACHE_TTL_SECONDS = 15 * 60 # 15 minutes
+# --- Cache Configuration (TTLs per data class live in cache.py) ---
+data_cache = build_default_cache()
+
+# --- In-flight Request Coalescing ---
+# Concurrent requests for the same (endpoint, ticker, params) share one computation; each caller
+# then builds its own response from the shared payload.
+request_flight = SingleFlight()
+
+# --- Precomputed Snapshots (written by the prewarm scheduler, served by the endpoints) ---
+def serve_snapshot(key, build_fn, use_snapshot=True):
+    # A fresh snapshot is returned as-is; otherwise the payload is computed (coalesced) on demand.
+    if use_snapshot:
+        snapshot = data_cache.get("snapshot", ":".join(key))
+        if snapshot is not None: return snapshot, 200
+    with span(f"build_{key[0]}"): return request_flight.do(key, build_fn)
+
+def snapshot_written_within(key, ttl, seconds=PREWARM_INTERVAL_SECONDS / 2):
+    # True when a snapshot stored with this ttl is younger than `seconds`: another worker wrote it during
+    # this tick (shared tier). Our own snapshot from the previous tick is about one interval old, so it is rebuilt.
+    return data_cache.expires_in("snapshot", ":".join(key)) > ttl - seconds
+
+def store_snapshot(key, build_fn, ttl, force=False):
+    if not force and snapshot_written_within(key, ttl): return False
+    payload, status = request_flight.do(key, build_fn)
+    if status == 200: data_cache.set("snapshot", ":".join(key), payload, ttl)
+    return status == 200
+
+# --- Upstream Data Source (swap for data_sources.FakeDataSource to run offline) ---
+data_source = InstrumentedDataSource(YFinanceDataSource())
 
  
 
 
 # --- Configuration ---
-NIFTY50_TICKERS = [
-    "ADANIENT.NS", "ADANIPORTS.NS", "APOLLOHOSP.NS", "ASIANPAINT.NS", "AXISBANK.NS",
-    "BAJAJ-AUTO.NS", "BAJFINANCE.NS", "BAJAJFINSV.NS", "BPCL.NS", "BHARTIARTL.NS",
-    "BRITANNIA.NS", "CIPLA.NS", "COALINDIA.NS", "DIVISLAB.NS", "DRREDDY.NS",
-    "EICHERMOT.NS", "GRASIM.NS", "HCLTECH.NS", "HDFCBANK.NS", "HDFCLIFE.NS",
-    "HEROMOTOCO.NS", "HINDALCO.NS", "HINDUNILVR.NS", "ICICIBANK.NS", "ITC.NS",
-    "INDUSINDBK.NS", "INFY.NS", "JSWSTEEL.NS", "KOTAKBANK.NS", "LTIM.NS", 
-    "LT.NS", "M&M.NS", "MARUTI.NS", "NTPC.NS", "NESTLEIND.NS", "ONGC.NS",
-    "POWERGRID.NS", "RELIANCE.NS", "SBILIFE.NS", "SBIN.NS", "SUNPHARMA.NS",
-    "TATAMOTORS.NS", "TCS.NS", "TATASTEEL.NS", "TECHM.NS", "TITAN.NS",
-    "ULTRACEMCO.NS", "UPL.NS", "WIPRO.NS","VOLTAS.NS"
-]
-
-SHORT_WINDOW = 20
-LONG_WINDOW = 50
+NIFTY50_TICKERS = load_universe(DEFAULT_UNIVERSE) # universes/nifty50.txt; other universe files are screener-only
+
+# DMA windows and signal thresholds live in dma_signals.py
 HISTORY_PERIOD_DAYS = max(LONG_WINDOW, SHORT_WINDOW) * 3 + 90
 
-# --- DMA Signal Nuance Parameters ---
-RECENT_CROSSOVER_DAYS = 5
-MA_SPREAD_STRONG_THRESHOLD = 0.015
-MA_SPREAD_NEUTRAL_THRESHOLD = 0.005
+# --- Shared Universe History (one bulk download serves overview, quick updates and detail) ---
+# Closed bars are persisted under OHLCV_DATA_DIR, so refreshes only fetch new bars.
+ohlcv_store = OHLCVStore()
+history_loader = HistoryLoader(NIFTY50_TICKERS, data_source, store=ohlcv_store)
+
+# --- Company Name Cache (names never change, so info is fetched once per ticker per process) ---
+ticker_names = {}
+
+def get_ticker_name(ticker_symbol, fetch=True):
+    if fetch and ticker_symbol not in ticker_names:
+        try:
+            ticker_names[ticker_symbol] = data_source.info(ticker_symbol).get('shortName', ticker_symbol)
+        except Exception as e:
+            print(f"  WARN: Could not fetch name for {ticker_symbol}: {e}")
+            return ticker_symbol
+    return ticker_names.get(ticker_symbol, ticker_symbol)
+
+def prefetch_ticker_names(tickers):
+    missing = [t for t in tickers if t not in ticker_names]
+    if missing: fetch_many(missing, get_ticker_name, rate_limiter=default_rate_limiter())
+
+# --- Latest quote (CMP, day change, volume) from the last two daily bars ---
+def quote_from_history(hist_df):
+    if hist_df is None or hist_df.empty: return None
+    cmp = hist_df.iloc[-1]['Close']
+    prev_close = hist_df.iloc[-2]['Close'] if len(hist_df) >= 2 else np.nan
+    volume = hist_df.iloc[-1]['Volume'] if 'Volume' in hist_df.columns else None
+    return quote_fields(cmp, prev_close, volume)
+
+def quote_fields(cmp, prev_close, volume):
+    day_change_abs, day_change_percent = None, None
+    if pd.notna(cmp) and pd.notna(prev_close) and prev_close != 0:
+        day_change_abs = cmp - prev_close
+        day_change_percent = (day_change_abs / prev_close) * 100
+    return {
+        "cmp": round(cmp, 2) if pd.notna(cmp) else None,
+        "dayChangePercent": round(day_change_percent, 2) if pd.notna(day_change_percent) else None,
+        "dayChangeAbs": round(day_change_abs, 2) if pd.notna(day_change_abs) else None,
+        "volume": int(volume) if pd.notna(volume) else None
+    }
 
 # --- Helper function to process financial statement DataFrames ---
 def format_financial_statement(df):
@@ -71,152 +137,212 @@ def format_financial_statement(df):
         traceback.print_exc()
         return None
 
+# --- DMA fields of one ticker (column `col`) from the vectorized signal engine ---
+def dma_signal_fields(signals, col, dates):
+    code, signal_index = signals["signal"][col], signals["signalIndex"][col]
+    sma_short_latest, sma_long_latest = (np.nan, np.nan) if code == SIG_NA_DATA else (signals["smaShortLatest"][col], signals["smaLongLatest"][col])
+    return {
+        "dmaSignal": SIGNAL_LABELS[code],
+        "lastSignalDate": pd.Timestamp(dates[signal_index]).strftime('%Y-%m-%d') if signal_index >= 0 else None,
+        "smaShort": round(float(sma_short_latest), 2) if pd.notna(sma_short_latest) else None,
+        "smaLong": round(float(sma_long_latest), 2) if pd.notna(sma_long_latest) else None
+    }
+
+def signal_window_start():
+    return pd.Timestamp(datetime.now() - timedelta(days=HISTORY_PERIOD_DAYS + 60)).normalize()
+
 # --- Helper Function to Get Stock Data and DMA Signal ---
-def get_stock_data_and_signal(ticker_symbol):
+def get_stock_data_and_signal(ticker_symbol, loader=None, hist_df=None):
+    # hist_df: the ticker's history already fetched by the caller (any window covering the signal window)
     print(f"Processing {ticker_symbol} for nuanced signal...")
+    loader = loader or history_loader
     try:
-        stock = yf.Ticker(ticker_symbol)
-        hist_data_end = datetime.now()
-        hist_data_start = hist_data_end - timedelta(days=HISTORY_PERIOD_DAYS + 60)
-        hist_df = stock.history(start=hist_data_start.strftime('%Y-%m-%d'), 
-                                end=hist_data_end.strftime('%Y-%m-%d'), 
-                                interval="1d")
-
-        if hist_df.empty or len(hist_df) < LONG_WINDOW:
-            print(f"  WARN: Not enough historical data for {ticker_symbol} (got {len(hist_df)}, need {LONG_WINDOW}).")
-            try:
-                info = stock.info
-                return {
-                    "ticker": ticker_symbol, "name": info.get('shortName', ticker_symbol),
-                    "cmp": info.get('currentPrice', info.get('regularMarketPrice', 0)),
-                    "dayChangePercent": (info.get('regularMarketChangePercent', 0)) * 100,
-                    "dayChangeAbs": info.get('regularMarketChange', 0), "volume": info.get('volume', 0),
-                    "dmaSignal": "N/A (Data)", "lastSignalDate": None, "smaShort": None, "smaLong": None,
-                }
-            except Exception: return None 
-
-        hist_df[f'SMA_{SHORT_WINDOW}'] = hist_df['Close'].rolling(window=SHORT_WINDOW, min_periods=1).mean()
-        hist_df[f'SMA_{LONG_WINDOW}'] = hist_df['Close'].rolling(window=LONG_WINDOW, min_periods=1).mean()
-        valid_ma_hist = hist_df.dropna(subset=[f'SMA_{SHORT_WINDOW}', f'SMA_{LONG_WINDOW}'])
-        
-        current_signal, date_of_signal, sma_short_latest, sma_long_latest = "N/A (Logic)", None, None, None
-
-        if len(valid_ma_hist) < 2:
-            if len(valid_ma_hist) == 1:
-                 sma_short_latest, sma_long_latest = valid_ma_hist.iloc[-1][f'SMA_{SHORT_WINDOW}'], valid_ma_hist.iloc[-1][f'SMA_{LONG_WINDOW}']
-                 current_signal = "INITIAL" 
-        else:
-            sma_short_col, sma_long_col = f'SMA_{SHORT_WINDOW}', f'SMA_{LONG_WINDOW}'
-            hist_with_signals = valid_ma_hist.copy()
-            hist_with_signals['BuyCrossover'] = (hist_with_signals[sma_short_col] > hist_with_signals[sma_long_col]) & (hist_with_signals[sma_short_col].shift(1) <= hist_with_signals[sma_long_col].shift(1))
-            hist_with_signals['SellCrossover'] = (hist_with_signals[sma_short_col] < hist_with_signals[sma_long_col]) & (hist_with_signals[sma_short_col].shift(1) >= hist_with_signals[sma_long_col].shift(1))
-            last_buy_event_date = hist_with_signals[hist_with_signals['BuyCrossover']].index.max() if not hist_with_signals[hist_with_signals['BuyCrossover']].empty else pd.NaT
-            last_sell_event_date = hist_with_signals[hist_with_signals['SellCrossover']].index.max() if not hist_with_signals[hist_with_signals['SellCrossover']].empty else pd.NaT
-            sma_short_latest, sma_long_latest = valid_ma_hist.iloc[-1][sma_short_col], valid_ma_hist.iloc[-1][sma_long_col]
-            days_since_last_buy = (date.today() - last_buy_event_date.date()).days if pd.notna(last_buy_event_date) else float('inf')
-            days_since_last_sell = (date.today() - last_sell_event_date.date()).days if pd.notna(last_sell_event_date) else float('inf')
-            ma_spread = (sma_short_latest - sma_long_latest) / sma_long_latest if sma_long_latest != 0 and pd.notna(sma_long_latest) else 0
-
-            if pd.notna(sma_short_latest) and pd.notna(sma_long_latest):
-                if sma_short_latest > sma_long_latest: 
-                    date_of_signal = last_buy_event_date.strftime('%Y-%m-%d') if pd.notna(last_buy_event_date) else None
-                    if pd.notna(last_buy_event_date) and (pd.isna(last_sell_event_date) or last_buy_event_date > last_sell_event_date):
-                        if days_since_last_buy <= RECENT_CROSSOVER_DAYS and ma_spread >= MA_SPREAD_STRONG_THRESHOLD: current_signal = "STRONG BUY"
-                        elif days_since_last_buy <= RECENT_CROSSOVER_DAYS: current_signal = "RECENT BUY"
-                        else: current_signal = "BUY (Uptrend)"
-                    else: current_signal, date_of_signal = "POTENTIAL BUY / RECOVERY", None
-                elif sma_short_latest < sma_long_latest: 
-                    date_of_signal = last_sell_event_date.strftime('%Y-%m-%d') if pd.notna(last_sell_event_date) else None
-                    if pd.notna(last_sell_event_date) and (pd.isna(last_buy_event_date) or last_sell_event_date > last_buy_event_date):
-                        if days_since_last_sell <= RECENT_CROSSOVER_DAYS and abs(ma_spread) >= MA_SPREAD_STRONG_THRESHOLD: current_signal = "STRONG SELL"
-                        elif days_since_last_sell <= RECENT_CROSSOVER_DAYS: current_signal = "RECENT SELL"
-                        else: current_signal = "SELL (Downtrend)"
-                    else: current_signal, date_of_signal = "POTENTIAL SELL / DECLINE", None
-                else: 
-                    current_signal = "NEUTRAL / SIDEWAYS"
-                    if pd.notna(last_buy_event_date) and pd.notna(last_sell_event_date): date_of_signal = max(last_buy_event_date, last_sell_event_date).strftime('%Y-%m-%d')
-                    elif pd.notna(last_buy_event_date): date_of_signal = last_buy_event_date.strftime('%Y-%m-%d')
-                    elif pd.notna(last_sell_event_date): date_of_signal = last_sell_event_date.strftime('%Y-%m-%d')
-                if abs(ma_spread) < MA_SPREAD_NEUTRAL_THRESHOLD and not (current_signal in ["STRONG BUY", "STRONG SELL"] and (days_since_last_buy <= RECENT_CROSSOVER_DAYS or days_since_last_sell <= RECENT_CROSSOVER_DAYS)):
-                    current_signal = "NEUTRAL / SIDEWAYS"
-                    if pd.notna(last_buy_event_date) and pd.notna(last_sell_event_date): date_of_signal = max(last_buy_event_date, last_sell_event_date).strftime('%Y-%m-%d')
-                    elif pd.notna(last_buy_event_date): date_of_signal = last_buy_event_date.strftime('%Y-%m-%d')
-                    elif pd.notna(last_sell_event_date): date_of_signal = last_sell_event_date.strftime('%Y-%m-%d')
-            else: current_signal, date_of_signal = "N/A (Logic)", None
-            if current_signal == "N/A (Logic)" and pd.notna(sma_short_latest) and pd.notna(sma_long_latest):
-                if sma_short_latest > sma_long_latest: current_signal = "BUY (Trend)"
-                elif sma_short_latest < sma_long_latest: current_signal = "SELL (Trend)"
-                else: current_signal = "NEUTRAL"
-        
-        latest_close_price, stock_name, cmp, day_change_abs, day_change_percent, current_volume = hist_df.iloc[-1]['Close'] if not hist_df.empty else np.nan, ticker_symbol, hist_df.iloc[-1]['Close'] if not hist_df.empty else np.nan, 0.0, 0.0, hist_df.iloc[-1]['Volume'] if not hist_df.empty and 'Volume' in hist_df.columns else 0
-        try:
-            info = stock.info
-            stock_name, cmp, prev_close = info.get('shortName', ticker_symbol), info.get('currentPrice', info.get('regularMarketPrice', latest_close_price)), info.get('previousClose')
-            if pd.notna(prev_close) and pd.notna(cmp) and prev_close != 0: day_change_abs, day_change_percent = cmp - prev_close, ((cmp - prev_close) / prev_close) * 100
-            vol_info = info.get('volume', info.get('regularMarketVolume'))
-            current_volume = int(vol_info) if pd.notna(vol_info) else (int(current_volume) if pd.notna(current_volume) else 0)
-        except Exception as e_info:
-            print(f"  WARN: Could not fetch detailed stock.info for {ticker_symbol}. Using historical. Error: {e_info}")
-            if len(hist_df) >= 2: day_change_abs, prev_close_for_calc = hist_df.iloc[-1]['Close'] - hist_df.iloc[-2]['Close'], hist_df.iloc[-2]['Close']; day_change_percent = ((day_change_abs / prev_close_for_calc) * 100) if pd.notna(prev_close_for_calc) and prev_close_for_calc != 0 else 0.0
-        return {"ticker": ticker_symbol, "name": stock_name, "cmp": round(cmp, 2) if pd.notna(cmp) else None, "dayChangePercent": round(day_change_percent, 2) if pd.notna(day_change_percent) else None, "dayChangeAbs": round(day_change_abs, 2) if pd.notna(day_change_abs) else None, "volume": int(current_volume) if pd.notna(current_volume) else None, "dmaSignal": current_signal, "lastSignalDate": date_of_signal, "smaShort": round(sma_short_latest, 2) if pd.notna(sma_short_latest) else None, "smaLong": round(sma_long_latest, 2) if pd.notna(sma_long_latest) else None}
+        if hist_df is not None: recent_df = hist_df[hist_df.index >= signal_window_start()]
+        else: recent_df = loader.ticker_history(ticker_symbol, start=signal_window_start())
+        if recent_df.empty:
+            print(f"  WARN: No historical data for {ticker_symbol}.")
+            return None
+        hist_df = recent_df[recent_df.index < pd.Timestamp(date.today())] # Signals use closed bars only
+        if len(hist_df) < LONG_WINDOW: print(f"  WARN: Not enough historical data for {ticker_symbol} (got {len(hist_df)}, need {LONG_WINDOW}).")
+        with span("indicators"): signals = compute_dma_signals(hist_df['Close'].to_numpy(dtype=float), hist_df.index.values)
+        return {"ticker": ticker_symbol, "name": get_ticker_name(ticker_symbol), **quote_from_history(recent_df), **dma_signal_fields(signals, 0, hist_df.index.values)}
     except Exception as e_main: print(f"  ERROR: Main processing in get_stock_data_and_signal for {ticker_symbol}: {str(e_main)}"); import traceback; traceback.print_exc(); return None
 
+# --- Overview row for a ticker that failed or timed out ---
+def overview_error_marker(ticker_symbol, message):
+    return {**error_marker(ticker_symbol, message), "dmaSignal": "N/A (Error)", "lastSignalDate": None, "smaShort": None, "smaLong": None}
+
+# --- Overview rows for many tickers: one vectorized signal pass over the close matrix ---
+def get_universe_signal_rows(tickers, loader=None):
+    loader = loader or history_loader
+    frame = loader.frame()
+    window_df = frame[frame.index >= signal_window_start()]
+    closed_df = window_df[window_df.index < pd.Timestamp(date.today())] # Signals use closed bars only
+    close = closed_df.xs('Close', axis=1, level=1).reindex(columns=tickers) if not closed_df.empty else pd.DataFrame(columns=tickers, dtype=float)
+    with span("indicators"): signals = compute_dma_signals(close.to_numpy(dtype=float), closed_df.index.values)
+    available = set(window_df.columns.get_level_values(0))
+    rows = []
+    for col, ticker in enumerate(tickers):
+        quote = quote_from_history(window_df[ticker].dropna(subset=['Close'])) if ticker in available else None
+        if quote is None:
+            rows.append(overview_error_marker(ticker, "No historical data"))
+            continue
+        rows.append({"ticker": ticker, "name": get_ticker_name(ticker), **quote, **dma_signal_fields(signals, col, closed_df.index.values)})
+    return rows
+
+# --- Live DMA state per ticker: each price poll feeds only the new bars into O(1) state ---
+live_dma_states = {} # ticker -> (loader history generation, IncrementalDMA)
+live_dma_lock = threading.Lock() # Guards the states only; never held across frame reads or upstream calls
+
+def live_dma_fields(state):
+    code, signal_date, sma_short_latest, sma_long_latest = state.signal()
+    return {
+        "dmaSignal": SIGNAL_LABELS[code],
+        "lastSignalDate": signal_date.strftime('%Y-%m-%d') if signal_date else None,
+        "smaShort": round(float(sma_short_latest), 2) if pd.notna(sma_short_latest) else None,
+        "smaLong": round(float(sma_long_latest), 2) if pd.notna(sma_long_latest) else None
+    }
+
+def update_live_dma_states(tickers, frame, loader=None):
+    """Feeds each ticker's closed bars after its state's last bar, and today's close as provisional,
+    from one slice of the wide frame; returns {ticker: DMA fields}. A state is rebuilt from the signal
+    window when it is new, when the loader re-adjusted the ticker's history, or when the frame's close
+    for the state's last bar no longer matches it (adjusted prices reloaded without a store)."""
+    loader = loader or history_loader
+    available = set(frame.columns.get_level_values(0)) if not frame.empty else set()
+    tickers = [t for t in tickers if t in available]
+    if not tickers: return {}
+    today = np.datetime64(date.today(), 'D')
+
+    def closes_from(start):
+        rows = frame.iloc[frame.index.searchsorted(start):]
+        dates = rows.index.values.astype('datetime64[D]')
+        return dates, rows.xs('Close', axis=1, level=1).reindex(columns=tickers).to_numpy(dtype=float), int(np.searchsorted(dates, today))
+
+    def needs_seed(entry, col):
+        if entry is None or entry[1].last_date is None or entry[0] != loader.history_generation(tickers[col]): return True
+        last = np.datetime64(entry[1].last_date, 'D')
+        i = int(np.searchsorted(dates, last))
+        if i >= len(dates) or dates[i] != last: return True
+        return not np.isnan(close[i, col]) and entry[1].last_close and abs(close[i, col] / entry[1].last_close - 1) > ADJUSTMENT_TOLERANCE
+
+    with live_dma_lock: current = [live_dma_states.get(t) for t in tickers]
+    known = [entry[1].last_date for entry in current if entry is not None and entry[1].last_date is not None]
+    window_start = signal_window_start()
+    tail_start = pd.Timestamp(np.datetime64(min(known), 'D')) if len(known) == len(tickers) else window_start
+    dates, close, closed_rows = closes_from(tail_start) # Usually just the state's last bar plus today's
+    seed = [col for col, entry in enumerate(current) if needs_seed(entry, col)]
+    if seed and tail_start > window_start: dates, close, closed_rows = closes_from(window_start)
+    seeded = {tickers[col]: (loader.history_generation(tickers[col]), IncrementalDMA.from_history(dates[:closed_rows], close[:closed_rows, col])) for col in seed}
+
+    fields = {}
+    with live_dma_lock:
+        live_dma_states.update(seeded)
+        for col, ticker_symbol in enumerate(tickers):
+            state = live_dma_states[ticker_symbol][1]
+            first = int(np.searchsorted(dates, np.datetime64(state.last_date, 'D') + 1)) if state.last_date is not None else 0
+            for i in range(first, closed_rows): state.add_bar(dates[i], close[i, col])
+            if closed_rows < len(dates): state.update_provisional(dates[-1], close[-1, col])
+            fields[ticker_symbol] = live_dma_fields(state)
+    return fields
+
+# --- Quick-update rows (quote + live DMA signal) for many tickers from the frame's recent rows ---
+def quick_error_marker(ticker_symbol, message):
+    print(f"  ERROR fetching quick info for {ticker_symbol}: {message}")
+    return error_marker(ticker_symbol, message)
+
+def get_universe_quick_rows(tickers, loader=None, frame=None):
+    loader = loader or history_loader
+    frame = loader.frame() if frame is None else frame
+    dma_fields = update_live_dma_states(tickers, frame, loader)
+    recent = frame.iloc[frame.index.searchsorted(pd.Timestamp(datetime.now() - timedelta(days=QUOTE_TAIL_DAYS)).normalize()):] if not frame.empty else frame
+    present = [t for t in tickers if t in dma_fields]
+    close = recent.xs('Close', axis=1, level=1).reindex(columns=present).to_numpy(dtype=float) if present else np.empty((0, 0))
+    volume = recent.xs('Volume', axis=1, level=1).reindex(columns=present).to_numpy(dtype=float) if present else np.empty((0, 0))
+    columns = {t: col for col, t in enumerate(present)}
+    rows = []
+    for ticker_symbol in tickers:
+        valid = np.flatnonzero(~np.isnan(close[:, columns[ticker_symbol]])) if ticker_symbol in columns else []
+        if not len(valid):
+            rows.append(quick_error_marker(ticker_symbol, "No recent price bars"))
+            continue
+        col, last = columns[ticker_symbol], valid[-1]
+        quote = quote_fields(close[last, col], close[valid[-2], col] if len(valid) > 1 else np.nan, volume[last, col])
+        rows.append({"ticker": ticker_symbol, "name": get_ticker_name(ticker_symbol), **quote, **dma_fields[ticker_symbol]})
+    return rows
+
 # --- Helper for Quick Info ---
-def get_stock_quick_info(ticker_symbol):
-    try: 
-        stock = yf.Ticker(ticker_symbol)
-        info = stock.info 
-        cmp = info.get('currentPrice', info.get('regularMarketPrice'))
-        prev_close = info.get('previousClose')       
-        day_change_abs = None
-        day_change_percent = None
-        if pd.notna(cmp) and pd.notna(prev_close) and prev_close != 0 :
-            day_change_abs = cmp - prev_close
-            day_change_percent = (day_change_abs / prev_close) * 100
-        
-        volume = info.get('volume', info.get('regularMarketVolume', 0))
-        return {
-            "ticker": ticker_symbol,
-            "name": info.get('shortName', ticker_symbol),
-            "cmp": round(cmp, 2) if pd.notna(cmp) else None,
-            "dayChangePercent": round(day_change_percent, 2) if pd.notna(day_change_percent) else None,
-            "dayChangeAbs": round(day_change_abs, 2) if pd.notna(day_change_abs) else None,
-            "volume": int(volume) if pd.notna(volume) else None
-        }
+def get_stock_quick_info(ticker_symbol, loader=None):
+    loader = loader or history_loader
+    try:
+        if ticker_symbol in loader.tickers: return get_universe_quick_rows([ticker_symbol], loader)[0]
+        # Outside the universe: one single-ticker request (no lock held), shaped like the wide frame.
+        hist_df = loader.ticker_history(ticker_symbol, start=signal_window_start())
+        frame = pd.concat({ticker_symbol: hist_df}, axis=1) if not hist_df.empty else pd.DataFrame()
+        return get_universe_quick_rows([ticker_symbol], loader, frame)[0]
     except Exception as e:
-        print(f"  ERROR fetching quick info for {ticker_symbol}: {str(e)}")
-        return {"ticker": ticker_symbol, "name": ticker_symbol.replace(".NS", ""), "cmp": None, "dayChangePercent": None, "dayChangeAbs": None, "volume": None, "error": True, "errorMessage": str(e)}
+        return quick_error_marker(ticker_symbol, str(e))
 
 # --- API Endpoints ---
-@app.route('/api/stock_overview_data', methods=['GET'])
-def get_stock_overview():
-    all_overview_data = []
+def build_stock_overview():
     tickers_to_process = NIFTY50_TICKERS 
     print(f"\n--- Processing {len(tickers_to_process)} tickers for overview ---")
     start_time_total = time.time()
-    for i, ticker in enumerate(tickers_to_process): 
-        stock_info = get_stock_data_and_signal(ticker) 
-        if stock_info: all_overview_data.append(stock_info)
-        time.sleep(0.1) 
-        if (i + 1) % 10 == 0: print(f"Processed {i+1}/{len(tickers_to_process)}."); time.sleep(0.3) 
-    end_time_total = time.time(); print(f"--- Finished overview in {end_time_total - start_time_total:.2f}s ---")
-    if not all_overview_data: return jsonify({"error": "Could not fetch overview data."}), 500
-    return jsonify(all_overview_data)
+    prefetch_ticker_names(tickers_to_process)
+    try:
+        history_loader.refresh_quotes()
+        all_overview_data = get_universe_signal_rows(tickers_to_process)
+    except Exception as e:
+        print(f"  ERROR: Could not load universe history: {e}")
+        return {"error": "Could not fetch overview data."}, 500
+    failed = sum(1 for item in all_overview_data if item.get("error"))
+    end_time_total = time.time(); print(f"--- Finished overview in {end_time_total - start_time_total:.2f}s ({failed} failed) ---")
+    if failed == len(all_overview_data): return {"error": "Could not fetch overview data."}, 500
+    return all_overview_data, 200
 
-@app.route('/api/stock_quick_updates', methods=['GET'])
-def get_stock_quick_updates_endpoint():
-    quick_updates = []
+@app.route('/api/stock_overview_data', methods=['GET'])
+def get_stock_overview():
+    payload, status = serve_snapshot(("stock_overview_data",), build_stock_overview)
+    return encode_payload(payload, status)
+
+def build_stock_quick_updates():
     tickers_to_process = NIFTY50_TICKERS
     print(f"\n--- Fetching quick updates for {len(tickers_to_process)} tickers ---")
     start_time_total = time.time()
-    for i, ticker in enumerate(tickers_to_process): 
-        info = get_stock_quick_info(ticker)
-        quick_updates.append(info)
-        time.sleep(0.05)
-        if (i + 1) % 20 == 0: print(f"Processed quick update {i+1}/{len(tickers_to_process)}."); time.sleep(0.2)
+    prefetch_ticker_names(tickers_to_process)
+    try: quick_updates = get_universe_quick_rows(tickers_to_process, frame=history_loader.refresh_quotes())
+    except Exception as e:
+        print(f"  ERROR: Could not load universe history: {e}")
+        return {"error": "Could not fetch quick data."}, 500
     end_time_total = time.time(); print(f"--- Finished quick updates in {end_time_total - start_time_total:.2f}s ---")
-    if all(item.get("error") for item in quick_updates if item): return jsonify({"error": "Could not fetch quick data."}), 500
-    return jsonify(quick_updates)
+    if all(item.get("error") for item in quick_updates if item): return {"error": "Could not fetch quick data."}, 500
+    return quick_updates, 200
+
+@app.route('/api/stock_quick_updates', methods=['GET'])
+def get_stock_quick_updates_endpoint():
+    payload, status = serve_snapshot(("stock_quick_updates",), build_stock_quick_updates)
+    return encode_payload(payload, status)
+
+# --- Streaming Quote Deltas (Server-Sent Events) ---
+def poll_stream_quotes():
+    # Reads the same (prewarmed) snapshot as /api/stock_quick_updates, so streaming adds no upstream calls.
+    payload, status = serve_snapshot(("stock_quick_updates",), build_stock_quick_updates)
+    return payload if status == 200 else []
+
+quote_broadcaster = QuoteBroadcaster(poll_stream_quotes)
+
+@app.route('/api/stream/quotes', methods=['GET'])
+def stream_quotes():
+    # ?tickers=TCS,INFY limits the stream; default is the whole universe.
+    tickers = [t.strip().upper() for t in request.args.get('tickers', '').split(',') if t.strip()]
+    tickers = [t if t.endswith(".NS") else t + ".NS" for t in tickers] or None
+    # The stream only carries universe quotes; a 404 makes EventSource give up, so the client polls instead.
+    unknown = [t for t in tickers or [] if t not in NIFTY50_TICKERS]
+    if unknown: return jsonify({"error": f"Not streamed (outside the universe): {', '.join(unknown)}"}), 404
+    subscription = quote_broadcaster.subscribe(tickers)
+    if subscription is None: # Stream slots are full: the client falls back to polling /api/stock_quick_info
+        return jsonify({"error": "Too many open quote streams, poll instead"}), 503, {"Retry-After": str(int(STREAM_POLL_SECONDS))}
+    return Response(subscription.sse(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route('/api/nifty50_list', methods=['GET'])
 def get_nifty50_list_actual():
@@ -231,127 +357,193 @@ def get_single_stock_quick_info_endpoint(ticker_symbol):
         ticker_symbol_to_fetch = ticker_symbol.upper() + ".NS"
     else:
         ticker_symbol_to_fetch = ticker_symbol.upper()
+    payload, status = request_flight.do(("stock_quick_info", ticker_symbol_to_fetch), lambda: build_single_stock_quick_info(ticker_symbol_to_fetch))
+    return encode_payload(payload, status)
 
+def build_single_stock_quick_info(ticker_symbol_to_fetch):
     print(f"\n--- Fetching SINGLE quick update for {ticker_symbol_to_fetch} ---")
+    if ticker_symbol_to_fetch in NIFTY50_TICKERS:
+        try: history_loader.refresh_quotes()
+        except Exception as e: print(f"  ERROR: Could not load universe history: {e}")
     quick_info = get_stock_quick_info(ticker_symbol_to_fetch)
     
     if quick_info and not quick_info.get("error"):
-        return jsonify(quick_info)
+        return quick_info, 200
     else:
         # Return a clear error if data for this specific ticker couldn't be fetched
-        return jsonify({"error": f"Could not fetch quick info for {ticker_symbol_to_fetch}", "details": quick_info}), 404
+        return {"error": f"Could not fetch quick info for {ticker_symbol_to_fetch}", "details": quick_info}, 404
 # --- END NEW API ENDPOINT ---
 
 
-# --- UPDATED Stock Detail Endpoint ---
-@app.route('/api/stock_detail/<ticker_symbol>', methods=['GET'])
-def get_stock_detail(ticker_symbol):
-    print(f"\n--- Requesting EXTENDED detail for {ticker_symbol} ---")
-    force_refresh = request.args.get('refresh', 'false').lower() == 'true'
-    
-    cached_entry = stock_detail_cache.get(ticker_symbol)
-    if not force_refresh and cached_entry:
-        data, timestamp = cached_entry
-        if (time.time() - timestamp) < CACHE_TTL_SECONDS:
-            print(f"  CACHE HIT for {ticker_symbol}")
-            return jsonify(data)
-        else:
-            print(f"  CACHE STALE for {ticker_symbol}. Re-fetching.")
-            if ticker_symbol in stock_detail_cache: del stock_detail_cache[ticker_symbol]
-    elif force_refresh:
-        print(f"  CACHE REFRESH FORCED for {ticker_symbol}")
-        if ticker_symbol in stock_detail_cache: del stock_detail_cache[ticker_symbol]
-    else:
-        print(f"  CACHE MISS for {ticker_symbol}. Fetching data.")
+# --- Stock Detail Parts (each cached under its own data class, see cache.CACHE_TTLS) ---
+FINANCIAL_STATEMENTS = {
+    "incomeStatementAnnual": "financials", "incomeStatementQuarterly": "quarterly_financials",
+    "balanceSheetAnnual": "balance_sheet", "balanceSheetQuarterly": "quarterly_balance_sheet",
+    "cashFlowAnnual": "cashflow", "cashFlowQuarterly": "quarterly_cashflow",
+}
 
-    base_stock_data = get_stock_data_and_signal(ticker_symbol) 
-    if not base_stock_data:
-        try:
-            stock_obj_fallback = yf.Ticker(ticker_symbol)
-            info_fallback = stock_obj_fallback.info
-            if info_fallback:
-                 print("  WARN: Base signal calc failed, returning only very basic info from fallback.")
-                 return jsonify({
-                     "info": {"ticker": ticker_symbol, "name": info_fallback.get('shortName', ticker_symbol), "error": "Signal/History Fetch Failed"},
-                     "currentMarketData": {"cmp": info_fallback.get('currentPrice')}, 
-                     "currentDma": {"signal": "N/A (Error)"},
-                     "historicalData": [], "dmaSignalsHistorical": [], "financialStatements": {}, "news": []
-                 })
-            else: return jsonify({"error": f"Could not fetch any data for {ticker_symbol}"}), 404
-        except Exception as fallback_e:
-            print(f"  ERROR: Fallback info fetch also failed for {ticker_symbol}: {fallback_e}")
-            return jsonify({"error": f"Could not fetch any data for {ticker_symbol}"}), 404
-    
-    stock_obj = yf.Ticker(ticker_symbol)
-    stock_info_obj = {} 
-    financials_annual, financials_quarterly, balance_sheet_annual, balance_sheet_quarterly, cash_flow_annual, cash_flow_quarterly = None, None, None, None, None, None
-    news_data_list = [] # Initialize here
-    historical_data_for_chart, dma_signals_historical = [], [] # Initialize here
-
-    try: # Main try for yfinance object data (info, financials)
-        stock_info_obj = stock_obj.info
-        if not stock_info_obj: 
-            print(f"  WARN: stock.info was empty for {ticker_symbol}.")
-            stock_info_obj = {} 
-        
-        # Fetch financial statements
-        try:
-            financials_annual = format_financial_statement(stock_obj.financials)
-            financials_quarterly = format_financial_statement(stock_obj.quarterly_financials)
-            balance_sheet_annual = format_financial_statement(stock_obj.balance_sheet)
-            balance_sheet_quarterly = format_financial_statement(stock_obj.quarterly_balance_sheet)
-            cash_flow_annual = format_financial_statement(stock_obj.cashflow)
-            cash_flow_quarterly = format_financial_statement(stock_obj.quarterly_cashflow)
-        except Exception as e_fin:
-            print(f"  WARN: Error fetching one or more financial statements for {ticker_symbol}: {e_fin}")
-    
-    except Exception as e_yf_main:
-        print(f"  ERROR: Major error fetching yfinance object data (info/financials) for {ticker_symbol}: {e_yf_main}")
-        if not isinstance(stock_info_obj, dict): stock_info_obj = {} # Ensure it's a dict
+def load_stock_info(ticker_symbol):
+    try:
+        stock_info_obj = data_source.info(ticker_symbol)
+        if not stock_info_obj: print(f"  WARN: stock.info was empty for {ticker_symbol}.")
+        return stock_info_obj or None
+    except Exception as e_info:
+        print(f"  ERROR: Could not fetch stock.info for {ticker_symbol}: {e_info}")
+        return None
 
-        
-    # Fetch Historical data for chart 
+def load_financial_statements(ticker_symbol):
+    # The six statements are independent upstream calls, so they are fetched in parallel.
+    def load_statement(key):
+        return format_financial_statement(data_source.statement(ticker_symbol, FINANCIAL_STATEMENTS[key]))
+    def statement_error(key, message):
+        print(f"  WARN: Error fetching {FINANCIAL_STATEMENTS[key]} for {ticker_symbol}: {message}")
+        return None
+    results = fetch_many(list(FINANCIAL_STATEMENTS), load_statement, max_workers=len(FINANCIAL_STATEMENTS),
+                         rate_limiter=default_rate_limiter(), on_error=statement_error)
+    statements = dict(zip(FINANCIAL_STATEMENTS, results))
+    return statements if any(v is not None for v in statements.values()) else None
+
+DETAIL_PARTS = {"quote": get_stock_data_and_signal, "info": load_stock_info, "financials": load_financial_statements}
+DETAIL_SECTIONS = ("financials", "history", "info", "signals") # ?sections= names, sorted
+PRICE_SECTIONS = {"history", "info", "signals"} # Sections built from universe prices
+DETAIL_PREWARM_SECTIONS = [DETAIL_SECTIONS, ("history", "info", "signals"), ("financials",)] # Full page, first paint, deferred statements
+
+def masked_column(values, decimals=None, as_int=False):
+    # Vectorized round + NaN -> None; astype(object) yields plain Python floats/ints for JSON.
+    values = np.asarray(values, dtype="f8")
+    missing = np.isnan(values)
+    if as_int: column = np.where(missing, 0, values).astype("i8").astype(object)
+    else: column = (np.round(values, decimals) if decimals is not None else values).astype(object)
+    column[missing] = None
+    return column.tolist()
+
+def columns_to_rows(columns):
+    # Columnar {field: [...]} -> row format [{field: value}, ...]
+    fields = list(columns)
+    return [dict(zip(fields, values)) for values in zip(*(columns[f] for f in fields))]
+
+def build_chart_history(ticker_symbol, detailed_hist_df):
+    """Chart series and historical crossovers in columnar form ({field: [values]})."""
+    historical_columns = {field: [] for field in ("time", "open", "high", "low", "close", "volume", "smaShort", "smaLong")}
+    signal_columns = {"time": [], "type": [], "priceAtSignal": []}
     try:
-        hist_data_end_detail = datetime.now()
-        hist_data_start_detail = hist_data_end_detail - timedelta(days=365*2 + 60)
-        detailed_hist_df = stock_obj.history(start=hist_data_start_detail.strftime('%Y-%m-%d'), 
-                                             end=hist_data_end_detail.strftime('%Y-%m-%d'), 
-                                             interval="1d")
-        
         if not detailed_hist_df.empty:
-            detailed_hist_df[f'SMA_{SHORT_WINDOW}'] = detailed_hist_df['Close'].rolling(window=SHORT_WINDOW, min_periods=1).mean()
-            detailed_hist_df[f'SMA_{LONG_WINDOW}'] = detailed_hist_df['Close'].rolling(window=LONG_WINDOW, min_periods=1).mean()
-            
-            for index, row in detailed_hist_df.iterrows():
-                historical_data_for_chart.append({
-                    "time": index.strftime('%Y-%m-%d'), 
-                    "open": round(row['Open'], 2) if pd.notna(row['Open']) else None,
-                    "high": round(row['High'], 2) if pd.notna(row['High']) else None,
-                    "low": round(row['Low'], 2) if pd.notna(row['Low']) else None,
-                    "close": round(row['Close'], 2) if pd.notna(row['Close']) else None,
-                    "volume": int(row['Volume']) if pd.notna(row['Volume']) else None,
-                    "smaShort": round(row.get(f'SMA_{SHORT_WINDOW}'), 2) if pd.notna(row.get(f'SMA_{SHORT_WINDOW}')) else None,
-                    "smaLong": round(row.get(f'SMA_{LONG_WINDOW}'), 2) if pd.notna(row.get(f'SMA_{LONG_WINDOW}')) else None,
-                })
-            
-            if len(detailed_hist_df) > 1:
-                sma_short_col_detail, sma_long_col_detail = f'SMA_{SHORT_WINDOW}', f'SMA_{LONG_WINDOW}'
-                if sma_short_col_detail in detailed_hist_df.columns and sma_long_col_detail in detailed_hist_df.columns: # Ensure columns exist
-                    chart_hist_df = detailed_hist_df[[sma_short_col_detail, sma_long_col_detail, 'Close']].copy()
-                    chart_hist_df = chart_hist_df.dropna(subset=[sma_short_col_detail, sma_long_col_detail])
-                    if len(chart_hist_df) > 1:
-                        chart_hist_df['BuyCrossover'] = (chart_hist_df[sma_short_col_detail] > chart_hist_df[sma_long_col_detail]) & (chart_hist_df[sma_short_col_detail].shift(1) <= chart_hist_df[sma_long_col_detail].shift(1))
-                        chart_hist_df['SellCrossover'] = (chart_hist_df[sma_short_col_detail] < chart_hist_df[sma_long_col_detail]) & (chart_hist_df[sma_short_col_detail].shift(1) >= chart_hist_df[sma_long_col_detail].shift(1))
-                        for index, row_data in chart_hist_df[chart_hist_df['BuyCrossover']].iterrows(): dma_signals_historical.append({"time": index.strftime('%Y-%m-%d'), "type": "BUY", "priceAtSignal": round(row_data['Close'], 2) if pd.notna(row_data['Close']) else None})
-                        for index, row_data in chart_hist_df[chart_hist_df['SellCrossover']].iterrows(): dma_signals_historical.append({"time": index.strftime('%Y-%m-%d'), "type": "SELL", "priceAtSignal": round(row_data['Close'], 2) if pd.notna(row_data['Close']) else None})
-                        dma_signals_historical.sort(key=lambda x: x['time'])
+            with span("indicators"):
+                close = detailed_hist_df['Close']
+                sma_short = close.rolling(window=SHORT_WINDOW, min_periods=1).mean().to_numpy()
+                sma_long = close.rolling(window=LONG_WINDOW, min_periods=1).mean().to_numpy()
+                times = detailed_hist_df.index.strftime('%Y-%m-%d').to_numpy(dtype=object)
+                historical_columns = {
+                    "time": times.tolist(),
+                    "open": masked_column(detailed_hist_df['Open'], 2), "high": masked_column(detailed_hist_df['High'], 2),
+                    "low": masked_column(detailed_hist_df['Low'], 2), "close": masked_column(close, 2),
+                    "volume": masked_column(detailed_hist_df['Volume'], as_int=True),
+                    "smaShort": masked_column(sma_short, 2), "smaLong": masked_column(sma_long, 2),
+                }
+
+                valid = ~(np.isnan(sma_short) | np.isnan(sma_long))
+                if valid.sum() > 1:
+                    s, l, closes, valid_times = sma_short[valid], sma_long[valid], close.to_numpy(dtype="f8")[valid], times[valid]
+                    buy = np.zeros(len(s), dtype=bool); sell = np.zeros(len(s), dtype=bool)
+                    buy[1:] = (s[1:] > l[1:]) & (s[:-1] <= l[:-1])
+                    sell[1:] = (s[1:] < l[1:]) & (s[:-1] >= l[:-1])
+                    events = np.flatnonzero(buy | sell) # already in date order
+                    signal_columns = {
+                        "time": valid_times[events].tolist(),
+                        "type": np.where(buy[events], "BUY", "SELL").tolist(),
+                        "priceAtSignal": masked_column(closes[events], 2),
+                    }
     except Exception as e_hist:
-        print(f"  ERROR: Could not fetch/process historical chart data for {ticker_symbol}: {e_hist}")
-   
+        print(f"  ERROR: Could not process historical chart data for {ticker_symbol}: {e_hist}")
+    return {"historicalData": historical_columns, "dmaSignalsHistorical": signal_columns}
+
+def chart_window_start():
+    return pd.Timestamp(datetime.now() - timedelta(days=365*2 + 60)).normalize()
 
-    # --- Construct the Final Payload ---
-    # (This construction remains largely the same, ensure all keys are .get() for safety)
-    detail_payload = { 
+def get_detail_history(ticker_symbol):
+    # Chart window including today's bar; the quote/signal part reads its slice of the same frame.
+    try: return history_loader.ticker_history(ticker_symbol, start=chart_window_start())
+    except Exception as e_hist:
+        print(f"  ERROR: Could not fetch historical data for {ticker_symbol}: {e_hist}")
+        return pd.DataFrame()
+
+def get_chart_history(ticker_symbol, force_refresh=False, hist_df=None):
+    # Keyed by the last closed bar, so a new trading day is a new entry rather than a stale hit.
+    if hist_df is None: hist_df = get_detail_history(ticker_symbol)
+    detailed_hist_df = hist_df[hist_df.index < pd.Timestamp(date.today())] if not hist_df.empty else hist_df
+    last_bar = detailed_hist_df.index[-1].strftime('%Y-%m-%d') if not detailed_hist_df.empty else "none"
+    return data_cache.get_or_load("history", f"{ticker_symbol}@{last_bar}/columns", lambda: build_chart_history(ticker_symbol, detailed_hist_df), force_refresh)
+
+# --- UPDATED Stock Detail Endpoint ---
+@app.route('/api/stock_detail/<ticker_symbol>', methods=['GET'])
+def get_stock_detail(ticker_symbol):
+    # refresh=true re-fetches prices and history; refresh=all also re-fetches info and financial statements.
+    refresh = request.args.get('refresh', 'false').lower()
+    if refresh not in ('true', 'all'): refresh = 'false'
+    # format=columnar returns historicalData/dmaSignalsHistorical as {field: [values]} instead of one object per row.
+    chart_format = 'columnar' if request.args.get('format', '').lower() == 'columnar' else 'rows'
+    # sections=info,history,signals,financials limits the payload (and the upstream calls) to those parts.
+    sections = tuple(sorted({s.strip().lower() for s in request.args.get('sections', '').split(',') if s.strip()})) or DETAIL_SECTIONS
+    unknown = [s for s in sections if s not in DETAIL_SECTIONS]
+    if unknown: return jsonify({"error": f"Unknown sections: {', '.join(unknown)}", "validSections": list(DETAIL_SECTIONS)}), 400
+    payload, status = serve_snapshot(detail_key(ticker_symbol, refresh, chart_format, sections),
+                                     lambda: build_stock_detail(ticker_symbol, refresh, chart_format, sections), use_snapshot=refresh == 'false')
+    if status == 200: record_detail_request(ticker_symbol)
+    return encode_payload(payload, status)
+
+def detail_key(ticker_symbol, refresh='false', chart_format='rows', sections=None):
+    return ("stock_detail", ticker_symbol, refresh, chart_format, ",".join(sorted(sections or DETAIL_SECTIONS)))
+
+def build_stock_detail(ticker_symbol, refresh='false', chart_format='rows', sections=None):
+    sections = set(sections or DETAIL_SECTIONS)
+    print(f"\n--- Requesting EXTENDED detail for {ticker_symbol} ({', '.join(sorted(sections))}) ---")
+    force_refresh, force_refresh_all = refresh in ('true', 'all'), refresh == 'all'
+    if force_refresh:
+        print(f"  CACHE REFRESH FORCED for {ticker_symbol} ({'all sections' if force_refresh_all else 'prices'})")
+        if ticker_symbol in NIFTY50_TICKERS and sections & PRICE_SECTIONS: # financials alone never read prices
+            try: history_loader.refresh_quotes(force_refresh=True)
+            except Exception as e: print(f"  ERROR: Could not refresh universe history: {e}")
+
+    # One history fetch per request, shared by the quote/signal part and the chart (only made if either needs it).
+    fetched = {}
+    def detail_history():
+        if "history" not in fetched: fetched["history"] = get_detail_history(ticker_symbol)
+        return fetched["history"]
+
+    detail_payload = {}
+    if sections & {"info", "signals"}:
+        # stock.info is fetched first so the quote part takes its name from it instead of calling stock.info again.
+        stock_info_obj = data_cache.get_or_load("info", ticker_symbol, lambda: DETAIL_PARTS["info"](ticker_symbol), force_refresh_all) if "info" in sections else None
+        if stock_info_obj and stock_info_obj.get('shortName'): ticker_names.setdefault(ticker_symbol, stock_info_obj['shortName'])
+        base_stock_data = data_cache.get_or_load("quote", ticker_symbol, lambda: DETAIL_PARTS["quote"](ticker_symbol, hist_df=detail_history()), force_refresh)
+        if not base_stock_data: return detail_fallback_payload(ticker_symbol, stock_info_obj, chart_format)
+        detail_payload.update(detail_quote_sections(ticker_symbol, base_stock_data, stock_info_obj or {}, sections))
+    if "history" in sections:
+        chart_history = get_chart_history(ticker_symbol, force_refresh, detail_history())
+        if chart_format != 'columnar': chart_history = {key: columns_to_rows(columns) for key, columns in chart_history.items()}
+        detail_payload.update(chart_history)
+    if "financials" in sections:
+        detail_payload["financialStatements"] = data_cache.get_or_load("financials", ticker_symbol, lambda: DETAIL_PARTS["financials"](ticker_symbol), force_refresh_all) or {key: None for key in FINANCIAL_STATEMENTS}
+    if sections == set(DETAIL_SECTIONS): detail_payload["news"] = []
+    print(f"  EXTENDED DATA assembled for {ticker_symbol}")
+    return detail_payload, 200
+
+def detail_fallback_payload(ticker_symbol, stock_info_obj, chart_format='rows'):
+    if stock_info_obj:
+        print("  WARN: Base signal calc failed, returning only very basic info from fallback.")
+        return {
+            "info": {"ticker": ticker_symbol, "name": stock_info_obj.get('shortName', ticker_symbol), "error": "Signal/History Fetch Failed"},
+            "currentMarketData": {"cmp": stock_info_obj.get('currentPrice')}, 
+            "currentDma": {"signal": "N/A (Error)"},
+            **(build_chart_history(ticker_symbol, pd.DataFrame()) if chart_format == 'columnar' else {"historicalData": [], "dmaSignalsHistorical": []}),
+            "financialStatements": {}, "news": []
+        }, 200
+    return {"error": f"Could not fetch any data for {ticker_symbol}"}, 404
+
+def detail_quote_sections(ticker_symbol, base_stock_data, stock_info_obj, sections):
+    # "info" -> info + currentMarketData, "signals" -> currentDma (ensure all keys are .get() for safety)
+    detail_payload = {}
+    if "info" in sections: detail_payload.update({
         "info": { 
             "ticker": base_stock_data.get("ticker", ticker_symbol), 
             "name": base_stock_data.get("name", stock_info_obj.get('shortName', ticker_symbol)), 
@@ -365,28 +557,191 @@ def get_stock_detail(ticker_symbol):
             "openPrice": stock_info_obj.get('open'), 
             "previousClosePrice": stock_info_obj.get('previousClose') 
         }, 
-        "historicalData": historical_data_for_chart, 
-        "dmaSignalsHistorical": dma_signals_historical, 
+    })
+    if "signals" in sections: detail_payload.update({
         "currentDma": { 
             "signal": base_stock_data.get("dmaSignal"), 
             "smaShortValue": base_stock_data.get("smaShort"), 
             "smaLongValue": base_stock_data.get("smaLong"), 
             "lastSignalDate": base_stock_data.get("lastSignalDate")
         }, 
-        "financialStatements": { 
-            "incomeStatementAnnual": financials_annual, 
-            "incomeStatementQuarterly": financials_quarterly, 
-            "balanceSheetAnnual": balance_sheet_annual, 
-            "balanceSheetQuarterly": balance_sheet_quarterly, 
-            "cashFlowAnnual": cash_flow_annual, 
-            "cashFlowQuarterly": cash_flow_quarterly,
-        }, 
-        "news": news_data_list # Use the variable assigned from NewsAPI
-    }
-    
-    stock_detail_cache[ticker_symbol] = (detail_payload, time.time())
-    print(f"  EXTENDED DATA (with NewsAPI) FETCHED and cached for {ticker_symbol}")
-    return jsonify(detail_payload)
+    })
+    return detail_payload
+
+# --- Screener (one columnar index per universe file, see screener.py) ---
+SCREENER_MAX_AGE_SECONDS = 2 * PREWARM_INTERVAL_SECONDS # Older indexes are rebuilt on request (normally the prewarm job keeps them fresh)
+universe_loaders = {DEFAULT_UNIVERSE: history_loader}
+screener_indexes = {}
+screener_fundamentals = {} # ticker -> FUNDAMENTAL_FIELDS values ({} after a failed fetch); refreshed by the prewarm jobs
+screener_fundamentals_pending = set() # universes with a background fundamentals fetch running
+screener_lock = threading.Lock()
+
+def get_universe_loader(universe):
+    with screener_lock:
+        loader = universe_loaders.get(universe)
+        if loader is None: loader = universe_loaders[universe] = HistoryLoader(load_universe(universe), data_source, store=ohlcv_store)
+        return loader
+
+def load_fundamentals(ticker_symbol):
+    stock_info_obj = data_source.info(ticker_symbol) or {}
+    if stock_info_obj.get('shortName'): ticker_names.setdefault(ticker_symbol, stock_info_obj['shortName'])
+    return {field: stock_info_obj.get(field) for field in FUNDAMENTAL_FIELDS}
+
+def refresh_screener_fundamentals(tickers):
+    if not tickers: return
+    print(f"  Fetching fundamentals for {len(tickers)} screener symbols")
+    results = fetch_many(tickers, load_fundamentals, rate_limiter=default_rate_limiter(), on_error=lambda ticker, message: {})
+    screener_fundamentals.update(zip(tickers, results))
+
+def build_screener_index(universe):
+    loader = get_universe_loader(universe)
+    frame = loader.refresh_quotes()
+    with span("screener_index"): index = ScreenerIndex.from_frame(frame, loader.tickers, signal_start=signal_window_start(), names=ticker_names, fundamentals=screener_fundamentals)
+    screener_indexes[universe] = index
+    return index
+
+def fetch_screener_fundamentals_in_background(universe, tickers):
+    # One fetch per universe at a time; the index is rebuilt once it lands, so later queries see the values.
+    with screener_lock:
+        if universe in screener_fundamentals_pending: return
+        screener_fundamentals_pending.add(universe)
+    def fetch():
+        try:
+            refresh_screener_fundamentals(tickers)
+            build_screener_index(universe)
+        except Exception as e: print(f"  ERROR: Could not fetch screener fundamentals for {universe}: {e}")
+        finally:
+            with screener_lock: screener_fundamentals_pending.discard(universe)
+    threading.Thread(target=fetch, name=f"screener-fundamentals-{universe}", daemon=True).start()
+
+def get_screener_index(universe, with_fundamentals=False):
+    # Without the prewarm jobs nothing fetches fundamentals, so a query that filters or sorts on them
+    # starts a background fetch of the universe's missing ones (once per symbol) and answers from the current index.
+    index = screener_indexes.get(universe)
+    tickers = get_universe_loader(universe).tickers
+    if index is None or time.time() - index.built_at >= SCREENER_MAX_AGE_SECONDS:
+        index = request_flight.do(("screener_index", universe), lambda: build_screener_index(universe))
+    missing = [t for t in tickers if t not in screener_fundamentals] if with_fundamentals else []
+    if missing: fetch_screener_fundamentals_in_background(universe, missing)
+    return index
+
+def query_fields(where, sort):
+    return {name for field, _, _, operand in where for name in (field, operand) if isinstance(name, str)} | {(sort or "").lstrip("-")}
+
+@app.route('/api/screener', methods=['GET'])
+def get_screener():
+    # e.g. ?universe=nifty50&signal=STRONG BUY,RECENT BUY&where=volume>2*averageVolume;cmp>=0.95*fiftyTwoWeekHigh&sort=-volumeRatio&limit=25
+    universe = request.args.get('universe', DEFAULT_UNIVERSE)
+    try:
+        where, signals = parse_where(request.args.get('where')), parse_signals(request.args.get('signal'))
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        if limit is not None and limit < 0: raise ValueError(f"limit must be 0 or more, got {limit}")
+        index = get_screener_index(universe, with_fundamentals=bool(query_fields(where, request.args.get('sort')) & set(FUNDAMENTAL_FIELDS)))
+        query_start = time.perf_counter()
+        rows, matched = index.query(where, signals, sort=request.args.get('sort'), limit=limit)
+        query_ms = (time.perf_counter() - query_start) * 1000
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0]), "universes": list_universes()}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"  ERROR: Could not build screener index for {universe}: {e}")
+        return jsonify({"error": f"Could not build screener index for {universe}"}), 500
+    return encode_payload({"universe": universe, "asOf": datetime.fromtimestamp(index.built_at).isoformat(timespec='seconds'),
+                           "symbols": len(index), "matched": matched, "fundamentalsMissing": index.fundamentals_missing(),
+                           "fundamentalsPending": universe in screener_fundamentals_pending,
+                           "queryMs": round(query_ms, 3), "results": rows})
+
+@app.route('/api/universes', methods=['GET'])
+def get_universes():
+    return jsonify([{"name": name, "symbols": len(load_universe(name))} for name in list_universes()])
+
+@app.route('/api/cache_stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(dict(data_cache.stats(), requestCoalescing=dict(request_flight.stats, inFlight=request_flight.in_flight()),
+                        quoteStream=dict(quote_broadcaster.stats, subscribers=quote_broadcaster.subscriber_count())))
+
+# --- Prometheus Metrics (histograms and upstream/cache counters in metrics.py; component stats read at scrape time) ---
+def collect_backend_metrics():
+    cache_stats = data_cache.stats()
+    tiers = [("memory", cache_stats["memory"])] + ([("shared", cache_stats["shared"])] if cache_stats["shared"] else [])
+    return [
+        ("cache_entries", "gauge", "Entries in the in-process cache tier.", [({"tier": "memory"}, cache_stats["memory"]["entries"])]),
+        ("cache_evictions_total", "counter", "Entries evicted from the in-process LRU tier.", [({"tier": "memory"}, cache_stats["memory"]["evictions"])]),
+        ("cache_expirations_total", "counter", "Lookups that found an expired entry.", [({"tier": tier}, stats["expirations"]) for tier, stats in tiers]),
+        ("request_coalescing_total", "counter", "Coalesced computations: leaders did the work, followers waited for it.",
+         [({"role": "leader"}, request_flight.stats["executed"]), ({"role": "follower"}, request_flight.stats["coalesced"])]),
+        ("quote_stream_subscribers", "gauge", "Open quote stream connections.", [({}, quote_broadcaster.subscriber_count())]),
+        ("quote_stream_events_total", "counter", "Quote stream polls, deltas, resyncs, dropped and rejected subscribers.", [({"kind": kind}, value) for kind, value in quote_broadcaster.stats.items()]),
+        ("screener_index_age_seconds", "gauge", "Seconds since each screener index was built.", [({"universe": universe}, round(time.time() - index.built_at, 3)) for universe, index in list(screener_indexes.items())]),
+    ]
+
+metrics.register_collector(collect_backend_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type=PROMETHEUS_MIMETYPE)
+
+# --- Background Prewarming (NSE hours; see prewarm.py) ---
+DETAIL_POPULARITY_MAX_TICKERS = int(os.environ.get("DETAIL_POPULARITY_MAX_TICKERS", "200")) # Distinct tickers counted before the least requested are dropped
+detail_request_counts = Counter()
+detail_request_lock = threading.Lock()
+
+def record_detail_request(ticker_symbol):
+    # Only served pages of known tickers count (universe, or upstream knows its name), so typos and probes are never prewarmed.
+    if ticker_symbol not in NIFTY50_TICKERS and ticker_names.get(ticker_symbol, ticker_symbol) == ticker_symbol: return
+    with detail_request_lock:
+        detail_request_counts[ticker_symbol] += 1
+        if len(detail_request_counts) > DETAIL_POPULARITY_MAX_TICKERS:
+            kept = detail_request_counts.most_common(DETAIL_POPULARITY_MAX_TICKERS // 2)
+            detail_request_counts.clear()
+            detail_request_counts.update(dict(kept))
+
+def popular_detail_tickers(count=PREWARM_DETAIL_TICKERS):
+    with detail_request_lock: return [t for t, _ in detail_request_counts.most_common(count)]
+
+def prewarm_detail(ticker_symbol, ttl, force=False):
+    # Reload parts that would expire before the next tick, then snapshot the assembled payload.
+    for data_class, load_fn in DETAIL_PARTS.items():
+        if data_cache.expires_in(data_class, ticker_symbol) <= 2 * PREWARM_INTERVAL_SECONDS:
+            data_cache.get_or_load(data_class, ticker_symbol, lambda: load_fn(ticker_symbol), force_refresh=True)
+    for sections in DETAIL_PREWARM_SECTIONS:
+        store_snapshot(detail_key(ticker_symbol, sections=sections), lambda: build_stock_detail(ticker_symbol, sections=sections), ttl, force=force)
+
+def prewarm_market_snapshots(ttl=2 * PREWARM_INTERVAL_SECONDS, force=False):
+    if force or not snapshot_written_within(("stock_overview_data",), ttl):
+        # Ticks land right on the QUOTE_REFRESH_SECONDS boundary, so force the tail download.
+        try: history_loader.refresh_quotes(force_refresh=True)
+        except Exception as e: print(f"  ERROR: Could not refresh universe history: {e}")
+    store_snapshot(("stock_overview_data",), build_stock_overview, ttl, force=force)
+    store_snapshot(("stock_quick_updates",), build_stock_quick_updates, ttl, force=force)
+    for ticker_symbol in popular_detail_tickers(): prewarm_detail(ticker_symbol, ttl, force=force)
+    prewarm_screener_indexes(refresh_fundamentals=force)
+
+def prewarm_screener_indexes(refresh_fundamentals=False):
+    # Fundamentals are fetched once per symbol intraday (missing ones only) and in full at end of day.
+    for universe in set(screener_indexes) | {DEFAULT_UNIVERSE}:
+        try:
+            tickers = get_universe_loader(universe).tickers
+            refresh_screener_fundamentals([t for t in tickers if refresh_fundamentals or t not in screener_fundamentals])
+            build_screener_index(universe)
+        except Exception as e: print(f"  ERROR: Could not prewarm screener index for {universe}: {e}")
+
+def prewarm_end_of_day():
+    # Final daily bars, then snapshots that stay valid until the next open.
+    history_loader.frame(force_refresh=True)
+    prewarm_market_snapshots(ttl=seconds_until_market_open(ist_now()) + PREWARM_INTERVAL_SECONDS, force=True)
+    with detail_request_lock: # Decay popularity so yesterday's hot tickers fade out
+        for ticker_symbol, count in list(detail_request_counts.items()):
+            if count > 1: detail_request_counts[ticker_symbol] = count // 2
+            else: del detail_request_counts[ticker_symbol]
+
+prewarm_scheduler = MarketHoursScheduler(prewarm_market_snapshots, prewarm_end_of_day)
+
+@app.before_request
+def start_prewarm_scheduler():
+    # Started by the first request so each gunicorn worker runs its own (post-fork) scheduler thread.
+    if PREWARM_ENABLED and not prewarm_scheduler.running: prewarm_scheduler.start()
 
 # --- Main Execution ---
 if __name__ == '__main__':
@@ -0,0 +1,186 @@
+# backtest.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dma_signals import (SHORT_WINDOW, LONG_WINDOW, RECENT_CROSSOVER_DAYS, MA_SPREAD_STRONG_THRESHOLD, MA_SPREAD_NEUTRAL_THRESHOLD,
+                         SIGNAL_LABELS, SIG_STRONG_BUY, SIG_RECENT_BUY, SIG_BUY_UPTREND, compact_columns, rolling_means, classify_dma)
+
+# --- Backtest Configuration ---
+LONG_SIGNALS = (SIG_STRONG_BUY, SIG_RECENT_BUY, SIG_BUY_UPTREND) # Held long while the signal is one of these, flat otherwise
+_LONG_POSITION = np.zeros(len(SIGNAL_LABELS) + 1) # Indexed by signal code; the extra last slot is for -1 (no bar)
+_LONG_POSITION[list(LONG_SIGNALS)] = 1.0
+DEFAULT_COST_BPS = 10.0 # Charged on every entry and exit
+TRADING_DAYS_PER_YEAR = 252
+
+
+# --- History Loading ---
+def load_close_matrix(store, tickers=None, start=None):
+    """(close, dates, tickers) from an ohlcv_store.OHLCVStore: a dates x tickers matrix, NaN where a ticker has no bar."""
+    closes = {t: store.load(t, start)["Close"] for t in (tickers or store.tickers())}
+    frame = pd.DataFrame({t: c for t, c in closes.items() if not c.empty}).sort_index()
+    return frame.to_numpy(dtype="f8"), frame.index.values.astype("datetime64[D]"), list(frame.columns)
+
+
+def prepare(close, dates):
+    """Per-matrix state shared by every parameter set: bars compacted per ticker, cell dates and returns."""
+    close = np.asarray(close, dtype="f8")
+    compact, order = compact_columns(close)
+    days = np.asarray(dates).astype("datetime64[D]").astype("i8")
+    cell_days = days[order] if order is not None else np.broadcast_to(days[:, None], close.shape)
+    valid = ~np.isnan(compact)
+    returns = np.full_like(compact, np.nan)
+    returns[1:] = compact[1:] / compact[:-1] - 1
+    return {"compact": compact, "cell_days": cell_days, "valid": valid, "bar_count": np.cumsum(valid, axis=0), "returns": returns}
+
+
+def signal_history(prepared, sma_short, sma_long, long_window=LONG_WINDOW, recent_days=RECENT_CROSSOVER_DAYS,
+                   strong_threshold=MA_SPREAD_STRONG_THRESHOLD, neutral_threshold=MA_SPREAD_NEUTRAL_THRESHOLD):
+    """Signal code of every ticker after every closed bar, classified by the live rules with that bar's date as today."""
+    n_rows, n_cols = sma_short.shape
+    prev_short, prev_long = np.full_like(sma_short, np.nan), np.full_like(sma_long, np.nan)
+    prev_short[1:], prev_long[1:] = sma_short[:-1], sma_long[:-1]
+    rows = np.arange(n_rows)[:, None]
+    # Running "last crossover row so far" per ticker.
+    last_buy = np.maximum.accumulate(np.where((sma_short > sma_long) & (prev_short <= prev_long), rows, -1), axis=0)
+    last_sell = np.maximum.accumulate(np.where((sma_short < sma_long) & (prev_short >= prev_long), rows, -1), axis=0)
+    cell_days = prepared["cell_days"]
+    days_since = lambda last: np.where(last >= 0, cell_days - np.take_along_axis(cell_days, np.maximum(last, 0), axis=0), np.inf)
+    signal, _, _ = classify_dma(sma_short, sma_long, last_buy, last_sell, days_since(last_buy), days_since(last_sell),
+                                prepared["bar_count"], long_window, recent_days, strong_threshold, neutral_threshold)
+    return np.where(prepared["valid"], signal, -1)
+
+
+def backtest_signals(prepared, signal, cost_bps=DEFAULT_COST_BPS):
+    """Per-ticker results of holding long while the signal is in LONG_SIGNALS (decided at the close, held from the next bar)."""
+    position = _LONG_POSITION[signal]
+    held = np.zeros_like(position)
+    held[1:] = position[:-1]
+    changes = np.abs(np.diff(held, axis=0, prepend=0.0))
+    strategy = np.nan_to_num(held * prepared["returns"]) - changes * cost_bps / 10_000
+    equity = np.cumprod(1 + strategy, axis=0)
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1
+
+    # Trades: runs of held bars, numbered per ticker; returns compounded per trade via grouped log sums.
+    n_rows, n_cols = held.shape
+    entries = (held == 1) & (np.diff(held, axis=0, prepend=0.0) == 1)
+    trade_id = np.cumsum(entries, axis=0) * (held == 1)
+    n_trades = entries.sum(axis=0)
+    slots = int(n_trades.max()) + 1 if n_cols else 1
+    keys = (np.arange(n_cols)[None, :] * slots + trade_id)[trade_id > 0]
+    trade_log = np.bincount(keys, weights=np.log1p(strategy)[trade_id > 0], minlength=n_cols * slots).reshape(n_cols, slots)[:, 1:]
+    trade_exists = np.arange(1, slots)[None, :] <= n_trades[:, None]
+    wins = ((trade_log > 0) & trade_exists).sum(axis=1)
+
+    valid = prepared["valid"]
+    bars = valid.sum(axis=0)
+    first = np.take_along_axis(prepared["compact"], np.argmax(valid, axis=0)[None, :], axis=0)[0]
+    last = prepared["compact"][-1] if n_rows else np.full(n_cols, np.nan)
+    total = equity[-1] - 1 if n_rows else np.zeros(n_cols)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        annualized = np.where(bars > 1, (1 + total) ** (TRADING_DAYS_PER_YEAR / np.maximum(bars - 1, 1)) - 1, np.nan)
+        return {
+            "totalReturn": total, "annualizedReturn": annualized, "buyHoldReturn": last / first - 1,
+            "maxDrawdown": drawdown.min(axis=0) if n_rows else np.zeros(n_cols),
+            "trades": n_trades, "wins": wins, "hitRate": np.where(n_trades > 0, wins / np.maximum(n_trades, 1), np.nan),
+            "exposure": np.where(bars > 0, held.sum(axis=0) / np.maximum(bars, 1), np.nan),
+        }
+
+
+def summarize(results, short_window, long_window):
+    trades, wins = int(results["trades"].sum()), int(results["wins"].sum())
+    return {
+        "shortWindow": short_window, "longWindow": long_window,
+        "meanReturn": float(np.nanmean(results["totalReturn"])), "medianReturn": float(np.nanmedian(results["totalReturn"])),
+        "meanAnnualizedReturn": float(np.nanmean(results["annualizedReturn"])),
+        "meanBuyHoldReturn": float(np.nanmean(results["buyHoldReturn"])),
+        "trades": trades, "hitRate": wins / trades if trades else None,
+        "meanMaxDrawdown": float(np.nanmean(results["maxDrawdown"])), "worstMaxDrawdown": float(np.nanmin(results["maxDrawdown"])),
+        "exposure": float(np.nanmean(results["exposure"])),
+    }
+
+
+def run_backtest(close, dates, short_window=SHORT_WINDOW, long_window=LONG_WINDOW, cost_bps=DEFAULT_COST_BPS, **thresholds):
+    """Backtest one (short, long) pair over every column of `close`; returns per-ticker result arrays."""
+    prepared = prepare(close, dates)
+    sma_short, sma_long = rolling_means(prepared["compact"], short_window, long_window)
+    return backtest_signals(prepared, signal_history(prepared, sma_short, sma_long, long_window, **thresholds), cost_bps)
+
+
+# --- Parameter Sweeps (vectorized across tickers, process pool across parameter sets) ---
+_worker_state = {}
+
+def _init_worker(close, dates):
+    _worker_state["prepared"] = prepare(close, dates)
+
+
+def _run_pairs(pairs, cost_bps, thresholds):
+    prepared = _worker_state["prepared"]
+    windows = sorted({w for pair in pairs for w in pair})
+    means = dict(zip(windows, rolling_means(prepared["compact"], *windows))) # one shared prefix sum per chunk
+    return [summarize(backtest_signals(prepared, signal_history(prepared, means[s], means[l], l, **thresholds), cost_bps), s, l) for s, l in pairs]
+
+
+def window_pairs(short_windows, long_windows):
+    return [(s, l) for s in short_windows for l in long_windows if s < l]
+
+
+def sweep(close, dates, pairs, workers=None, cost_bps=DEFAULT_COST_BPS, chunks_per_worker=4, **thresholds):
+    """Summaries for every (short, long) pair, in input order. workers=1 runs in-process."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pairs) < 2:
+        _init_worker(close, dates)
+        return _run_pairs(pairs, cost_bps, thresholds)
+    # Pairs stay in order, so neighbouring pairs (sharing windows) land in the same chunk.
+    n_chunks = min(len(pairs), workers * chunks_per_worker)
+    chunks = [list(chunk) for chunk in np.array_split(np.array(pairs, dtype=object), n_chunks) if len(chunk)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(close, dates)) as pool:
+        results = pool.map(_run_pairs, [[tuple(p) for p in chunk] for chunk in chunks], [cost_bps] * len(chunks), [thresholds] * len(chunks))
+        return [summary for chunk in results for summary in chunk]
+
+
+# --- Command Line ---
+if __name__ == '__main__':
+    import argparse
+    import time
+    from ohlcv_store import OHLCVStore, OHLCV_DATA_DIR
+
+    def window_range(text):
+        start, stop, step = (int(x) for x in text.split(":"))
+        return list(range(start, stop + 1, step))
+
+    parser = argparse.ArgumentParser(description="Backtest the DMA crossover signals over stored daily history.")
+    parser.add_argument("--data-dir", default=OHLCV_DATA_DIR)
+    parser.add_argument("--synthetic-years", type=float, help="Use data_sources.FakeDataSource history for the Nifty 50 instead of the store")
+    parser.add_argument("--short", type=window_range, default=[SHORT_WINDOW], help="start:stop:step")
+    parser.add_argument("--long", type=window_range, default=[LONG_WINDOW], help="start:stop:step")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cost-bps", type=float, default=DEFAULT_COST_BPS)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.synthetic_years:
+        from data_sources import FakeDataSource
+        from screener import load_universe, DEFAULT_UNIVERSE
+        NIFTY50_TICKERS = load_universe(DEFAULT_UNIVERSE)
+        start = pd.Timestamp.today().normalize() - pd.Timedelta(days=int(args.synthetic_years * 365))
+        wide = FakeDataSource(latency=0).download(NIFTY50_TICKERS, start=start.strftime('%Y-%m-%d'), end=pd.Timestamp.today().strftime('%Y-%m-%d'))
+        frame = wide.xs("Close", axis=1, level=1)
+        close, dates, tickers = frame.to_numpy(dtype="f8"), frame.index.values.astype("datetime64[D]"), list(frame.columns)
+    else:
+        close, dates, tickers = load_close_matrix(OHLCVStore(args.data_dir))
+    if not tickers: raise SystemExit(f"No stored history under {args.data_dir}")
+
+    pairs = window_pairs(args.short, args.long)
+    print(f"{len(tickers)} tickers x {len(dates)} bars ({dates[0]} to {dates[-1]}), {len(pairs)} window pairs")
+    started = time.perf_counter()
+    summaries = sweep(close, dates, pairs, workers=args.workers, cost_bps=args.cost_bps)
+    print(f"Finished in {time.perf_counter() - started:.2f}s\n")
+    print(f"{'short':>5} {'long':>5} {'mean ret':>9} {'median':>8} {'b&h':>8} {'hit':>6} {'trades':>7} {'avg DD':>8} {'worst DD':>9} {'exposure':>9}")
+    for s in sorted(summaries, key=lambda s: s["meanReturn"], reverse=True)[:args.top]:
+        hit = f"{s['hitRate']:.1%}" if s["hitRate"] is not None else "n/a"
+        print(f"{s['shortWindow']:>5} {s['longWindow']:>5} {s['meanReturn']:>9.1%} {s['medianReturn']:>8.1%} {s['meanBuyHoldReturn']:>8.1%} "
+              f"{hit:>6} {s['trades']:>7} {s['meanMaxDrawdown']:>8.1%} {s['worstMaxDrawdown']:>9.1%} {s['exposure']:>9.1%}")
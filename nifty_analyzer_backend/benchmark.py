@@ -0,0 +1,193 @@
+# benchmark.py
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# --- Benchmark Configuration ---
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_FIXTURE_DIR = os.environ.get("BENCH_FIXTURE_DIR", os.path.join(BENCH_DIR, "data", "fixtures"))
+BENCH_BASELINE_PATH = os.environ.get("BENCH_BASELINE_PATH", os.path.join(BENCH_DIR, "benchmark_baseline.json"))
+FIXTURE_HISTORY_DAYS = 365 * 3 # Covers the widest window any endpoint reads (history_loader.UNIVERSE_HISTORY_DAYS)
+REGRESSION_TOLERANCE = 0.20 # p95 slower, or throughput lower, by more than this fraction counts as a regression
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds."""
+    values = np.asarray(samples, dtype="f8") * 1000
+    if not len(values): return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3), "mean": round(values.mean(), 3), "max": round(values.max(), 3)}
+
+
+# --- Function-level Benchmarks ---
+def time_calls(fn, args_list, repeat):
+    """Each call timed on its own, every args tuple `repeat` times; a first untimed pass warms caches."""
+    for args in args_list: fn(*args)
+    samples = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for args in args_list:
+            call_started = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - call_started)
+    return samples, time.perf_counter() - started
+
+
+def run_function_benchmarks(app_module, replay, tickers, repeat):
+    now = datetime.now()
+    chart_frames = [(t, app_module.history_loader.ticker_history(t, start=now - timedelta(days=365*2 + 60), end=now.date())) for t in tickers]
+    def chart_rows(ticker_symbol, detailed_hist_df):
+        # The historicalData builder as the detail endpoint runs it (columnar build, then row format)
+        return {key: app_module.columns_to_rows(columns) for key, columns in app_module.build_chart_history(ticker_symbol, detailed_hist_df).items()}
+    cases = {
+        "get_stock_data_and_signal": (app_module.get_stock_data_and_signal, [(t,) for t in tickers]),
+        "format_financial_statement": (app_module.format_financial_statement, [(df,) for df in replay.statements().values()]),
+        "build_chart_history": (chart_rows, chart_frames),
+    }
+    results = {}
+    for name, (fn, args_list) in cases.items():
+        samples, seconds = time_calls(fn, args_list, repeat)
+        results[name] = dict(percentiles(samples), calls=len(samples), throughput=round(len(samples) / seconds, 1))
+    return results
+
+
+# --- Endpoint Load Benchmarks (Flask test client) ---
+def endpoint_scenarios(tickers):
+    return {
+        "overview": ["/api/stock_overview_data"],
+        "quick_updates": ["/api/stock_quick_updates"],
+        "detail": [f"/api/stock_detail/{t}" for t in tickers],
+        "detail_refresh": [f"/api/stock_detail/{t}?refresh=true" for t in tickers], # Re-downloads quotes and rebuilds the chart
+    }
+
+
+def load_test(flask_app, paths, requests, concurrency):
+    """`requests` GETs cycling through `paths` from `concurrency` threads, one test client each."""
+    samples, errors = [], []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        client = flask_app.test_client()
+        while True:
+            with lock: i = next(counter, None)
+            if i is None: return
+            started = time.perf_counter()
+            response = client.get(paths[i % len(paths)])
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append(elapsed)
+                if response.status_code != 200: errors.append(response.status_code)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]: future.result()
+    return samples, errors, time.perf_counter() - started
+
+
+def run_endpoint_benchmarks(app_module, tickers, requests, concurrency):
+    results = {}
+    for name, paths in endpoint_scenarios(tickers).items():
+        load_test(app_module.app, paths, len(paths), 1) # warm-up pass, not reported
+        samples, errors, seconds = load_test(app_module.app, paths, requests, concurrency)
+        results[name] = dict(percentiles(samples), calls=len(samples), errors=len(errors), throughput=round(len(samples) / seconds, 1))
+    return results
+
+
+# --- Reporting and Baseline Comparison ---
+def print_results(results):
+    print(f"\n{'benchmark':<28} {'calls':>6} {'err':>4} {'per s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<28} {r['calls']:>6} {r.get('errors', 0):>4} {r['throughput']:>9.1f} {r['p50']:>9.3f} {r['p95']:>9.3f} {r['p99']:>9.3f} {r['max']:>9.3f}")
+
+
+def print_stage_breakdown(metrics, top=10):
+    stages = sorted(((dict(key)["stage"], count, seconds) for key, (count, seconds) in metrics.histogram_totals("stage_duration_seconds").items()), key=lambda s: -s[2])
+    print(f"\n{'stage (all benchmarks)':<28} {'count':>8} {'total s':>9} {'mean ms':>9}")
+    for stage, count, seconds in stages[:top]: print(f"{stage:<28} {count:>8} {seconds:>9.3f} {seconds / count * 1000:>9.3f}")
+
+
+def compare_to_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Prints p95 and throughput changes per benchmark; returns the names that regressed."""
+    regressions = []
+    print(f"\n{'vs baseline':<28} {'p95 ms':>9} {'was':>9} {'change':>8} {'per s':>9} {'was':>9} {'change':>8}")
+    for name, r in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old: continue
+        p95_change = r["p95"] / old["p95"] - 1 if old["p95"] else 0.0
+        throughput_change = r["throughput"] / old["throughput"] - 1 if old["throughput"] else 0.0
+        regressed = p95_change > tolerance or throughput_change < -tolerance
+        if regressed: regressions.append(name)
+        print(f"{name:<28} {r['p95']:>9.3f} {old['p95']:>9.3f} {p95_change:>+8.1%} {r['throughput']:>9.1f} {old['throughput']:>9.1f} {throughput_change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+# --- Command Line ---
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline benchmark of the backend against recorded upstream fixtures.")
+    parser.add_argument("--fixtures", default=BENCH_FIXTURE_DIR)
+    parser.add_argument("--record", choices=("fake", "yfinance"), help="(Re)record fixtures for the Nifty 50 from this source, then exit")
+    parser.add_argument("--latency", type=float, default=0.05, help="Synthetic seconds per upstream call")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Extra uniform random seconds per upstream call")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the tickers for function benchmarks")
+    parser.add_argument("--baseline", default=BENCH_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--output", help="Also write this run's results as JSON")
+    args = parser.parse_args()
+
+    # The app reads its configuration at import time: no background threads, a throwaway OHLCV
+    # store, no shared cache and no fetch throttling, so only the code under test is measured.
+    os.environ.update(PREWARM_ENABLED="0", OHLCV_DATA_DIR=tempfile.mkdtemp(prefix="bench-ohlcv-"), CACHE_SHARED_PATH="", FETCH_RATE_PER_SECOND="0")
+    import app as app_module
+    from data_sources import FakeDataSource, ReplayDataSource, InstrumentedDataSource, YFinanceDataSource, record_fixtures
+    from metrics import metrics
+
+    tickers = app_module.NIFTY50_TICKERS
+    if args.record or not os.path.isdir(args.fixtures) or not os.listdir(args.fixtures):
+        source = YFinanceDataSource() if args.record == "yfinance" else FakeDataSource(latency=0)
+        print(f"Recording fixtures for {len(tickers)} tickers from {source.name} into {args.fixtures}")
+        end = datetime.now() + timedelta(days=1)
+        record_fixtures(source, tickers, args.fixtures, (end - timedelta(days=FIXTURE_HISTORY_DAYS)).strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'),
+                        statements=app_module.FINANCIAL_STATEMENTS.values())
+        if args.record: sys.exit(0)
+
+    replay = ReplayDataSource(args.fixtures, latency=args.latency, jitter=args.jitter)
+    missing = sorted(set(tickers) - set(replay.tickers))
+    if missing: print(f"  WARN: No fixtures for {len(missing)} tickers: {', '.join(missing)}")
+    app_module.data_source = app_module.history_loader.source = InstrumentedDataSource(replay)
+
+    print(f"Replaying {len(replay.tickers)} tickers from {args.fixtures} at {args.latency * 1000:.0f}+{args.jitter * 1000:.0f} ms per upstream call")
+    started = time.perf_counter()
+    results = run_function_benchmarks(app_module, replay, tickers, args.repeat)
+    results.update(run_endpoint_benchmarks(app_module, tickers, args.requests, args.concurrency))
+    print(f"\nFinished in {time.perf_counter() - started:.1f}s")
+    print_results(results)
+    print_stage_breakdown(metrics)
+
+    run = {"createdAt": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(), "machine": platform.machine(),
+           "config": {"latency": args.latency, "jitter": args.jitter, "requests": args.requests, "concurrency": args.concurrency, "repeat": args.repeat},
+           "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: json.dump(run, f, indent=2)
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+        if baseline.get("config") != run["config"]: print(f"\n  WARN: Baseline was recorded with {baseline.get('config')}")
+        regressions = compare_to_baseline(results, baseline)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f: json.dump(run, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,236 @@
+# cache.py
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from metrics import metrics, span
+
+# --- Cache Configuration ---
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "512"))
+CACHE_SHARED_PATH = os.environ.get("CACHE_SHARED_PATH", "") # SQLite file shared by all gunicorn workers; empty disables
+CACHE_SHARED_MAX_ROWS = int(os.environ.get("CACHE_SHARED_MAX_ROWS", "20000")) # 0 disables the row cap
+CACHE_SHARED_PURGE_EVERY = int(os.environ.get("CACHE_SHARED_PURGE_EVERY", "200")) # Purge expired rows every N writes per worker
+
+# TTL per data class, in seconds
+CACHE_TTLS = {
+    "quote": 15,                  # CMP, day change, live DMA signal
+    "history": 24 * 60 * 60,      # Daily bars only change once a day (entries are keyed by last bar date)
+    "info": 6 * 60 * 60,          # stock.info: profile, ratios, analyst targets
+    "financials": 3 * 24 * 60 * 60, # Statements change quarterly
+    "snapshot": 30,               # Precomputed endpoint payloads; the prewarm scheduler sets its own TTL
+}
+DEFAULT_TTL_SECONDS = 15 * 60
+
+
+# --- In-process LRU Tier ---
+class LRUCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, clock=time.time):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict() # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key, value, ttl, expires_at=None):
+        with self._lock:
+            self._entries[key] = (value, expires_at if expires_at is not None else self._clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def delete(self, key):
+        with self._lock: self._entries.pop(key, None)
+
+    def expires_in(self, key):
+        # Seconds until the entry expires (0 when absent); does not count as a lookup.
+        with self._lock: entry = self._entries.get(key)
+        return max(0.0, entry[1] - self._clock()) if entry is not None else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# --- Shared SQLite Tier (one file, visible to every worker process on the host) ---
+class SQLiteCache:
+    def __init__(self, path=CACHE_SHARED_PATH, clock=time.time, max_rows=CACHE_SHARED_MAX_ROWS, purge_every=CACHE_SHARED_PURGE_EVERY):
+        self.path = path
+        self._clock = clock
+        self.max_rows = max_rows
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expirations": 0, "evictions": 0, "purges": 0, "errors": 0}
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._connection().execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"  WARN: Shared cache read failed for {key}: {e}")
+            self.stats["errors"] += 1
+            return None, None
+        if row is None:
+            self.stats["misses"] += 1
+            return None, None
+        if row[1] <= self._clock():
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            self.delete(key)
+            return None, None
+        self.stats["hits"] += 1
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, ttl):
+        try:
+            self._connection().execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                                       (key, json.dumps(value, default=str), self._clock() + ttl))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"  WARN: Shared cache write failed for {key}: {e}")
+            self.stats["errors"] += 1
+            return
+        with self._writes_lock:
+            self._writes += 1
+            due = self.purge_every > 0 and self._writes % self.purge_every == 0
+        if due: self.purge()
+
+    def purge(self):
+        """Deletes expired rows, then the soonest-expiring rows beyond max_rows.
+
+        Expired rows are otherwise only removed when their key is read again, and keys that are
+        never reread (e.g. history keyed by an old last bar date) would grow the file without bound.
+        """
+        try:
+            conn = self._connection()
+            expired = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (self._clock(),)).rowcount
+            evicted = 0
+            if self.max_rows > 0:
+                excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_rows
+                if excess > 0:
+                    evicted = conn.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at LIMIT ?)", (excess,)).rowcount
+        except sqlite3.Error as e:
+            print(f"  WARN: Shared cache purge failed: {e}")
+            self.stats["errors"] += 1
+            return
+        self.stats["purges"] += 1
+        self.stats["expirations"] += expired
+        self.stats["evictions"] += evicted
+
+    def delete(self, key):
+        try: self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error as e: print(f"  WARN: Shared cache delete failed for {key}: {e}")
+
+    def expires_in(self, key):
+        try: row = self._connection().execute("SELECT expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error: return 0.0
+        return max(0.0, row[0] - self._clock()) if row is not None else 0.0
+
+
+# --- Two-tier Cache with per-data-class TTLs ---
+class TieredCache:
+    """LRU in-process tier in front of an optional shared tier.
+
+    Keys are (data_class, key); the data class picks the TTL from CACHE_TTLS. Values are
+    expected to be JSON-serializable so they can live in the shared tier.
+    """
+
+    def __init__(self, memory=None, shared=None, ttls=None):
+        self.memory = memory if memory is not None else LRUCache() # an empty LRUCache is falsy (__len__)
+        self.shared = shared
+        self.ttls = dict(CACHE_TTLS, **(ttls or {}))
+
+    @staticmethod
+    def _key(data_class, key):
+        return f"{data_class}:{key}"
+
+    def ttl(self, data_class):
+        return self.ttls.get(data_class, DEFAULT_TTL_SECONDS)
+
+    def get(self, data_class, key):
+        with span("cache_lookup"):
+            value, result = self._get(self._key(data_class, key))
+        metrics.inc("cache_lookups_total", data_class=data_class, result=result)
+        return value
+
+    def _get(self, full_key):
+        value = self.memory.get(full_key)
+        if value is not None: return value, "memory_hit"
+        if self.shared is None: return None, "miss"
+        value, expires_at = self.shared.get(full_key)
+        if value is None: return None, "miss"
+        self.memory.set(full_key, value, None, expires_at=expires_at) # promote, keeping the shared expiry
+        return value, "shared_hit"
+
+    def set(self, data_class, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl(data_class)
+        full_key = self._key(data_class, key)
+        self.memory.set(full_key, value, ttl)
+        if self.shared is not None: self.shared.set(full_key, value, ttl)
+
+    def delete(self, data_class, key):
+        full_key = self._key(data_class, key)
+        self.memory.delete(full_key)
+        if self.shared is not None: self.shared.delete(full_key)
+
+    def expires_in(self, data_class, key):
+        """Seconds left before the entry expires in either tier (0 when it is not cached)."""
+        full_key = self._key(data_class, key)
+        remaining = self.memory.expires_in(full_key)
+        if self.shared is not None: remaining = max(remaining, self.shared.expires_in(full_key))
+        return remaining
+
+    def get_or_load(self, data_class, key, load_fn, force_refresh=False):
+        """Cached value, or load_fn() stored under the data class TTL (None results are not cached)."""
+        if not force_refresh:
+            value = self.get(data_class, key)
+            if value is not None: return value
+        value = load_fn()
+        if value is not None: self.set(data_class, key, value)
+        return value
+
+    def stats(self):
+        memory_stats = dict(self.memory.stats, entries=len(self.memory), maxEntries=self.memory.max_entries)
+        lookups = memory_stats["hits"] + memory_stats["misses"]
+        memory_stats["hitRatio"] = round(memory_stats["hits"] / lookups, 4) if lookups else None
+        return {"memory": memory_stats, "shared": dict(self.shared.stats, path=self.shared.path) if self.shared is not None else None, "ttls": self.ttls}
+
+
+def build_default_cache():
+    shared = None
+    if CACHE_SHARED_PATH:
+        try:
+            shared = SQLiteCache(CACHE_SHARED_PATH)
+            shared.purge() # drop what expired while no worker was running
+        except sqlite3.Error as e: print(f"  WARN: Shared cache disabled, could not open {CACHE_SHARED_PATH}: {e}")
+    return TieredCache(LRUCache(CACHE_MAX_ENTRIES), shared)
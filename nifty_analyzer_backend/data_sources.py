@@ -0,0 +1,244 @@
+# data_sources.py
+
+import os
+import json
+import time
+import random
+import zlib
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from metrics import metrics, span
+
+
+# --- Upstream Data Sources ---
+# Every backend code path talks to the upstream through one of these objects, so the
+# live yfinance source can be swapped for a local fake when benchmarking offline.
+
+class YFinanceDataSource:
+    name = "yfinance"
+
+    def history(self, ticker_symbol, start, end, interval="1d"):
+        return yf.Ticker(ticker_symbol).history(start=start, end=end, interval=interval)
+
+    def info(self, ticker_symbol):
+        return yf.Ticker(ticker_symbol).info
+
+    def statement(self, ticker_symbol, name):
+        # name is a yf.Ticker statement attribute, e.g. "financials" or "quarterly_cashflow"
+        return getattr(yf.Ticker(ticker_symbol), name)
+
+    def download(self, tickers, start, end, interval="1d"):
+        # One bulk request for the whole universe; columns are (ticker, field).
+        return yf.download(list(tickers), start=start, end=end, interval=interval, group_by="ticker",
+                           auto_adjust=True, actions=False, threads=True, progress=False)
+
+
+class InstrumentedDataSource:
+    """Wraps another data source: each call is an upstream_<method> timing span and is counted in
+    upstream_requests_total by method and outcome (ok, empty, error)."""
+
+    def __init__(self, source):
+        self.source = source
+        self.name = source.name
+
+    def _call(self, method, *args, **kwargs):
+        outcome = "error"
+        try:
+            with span(f"upstream_{method}"): result = getattr(self.source, method)(*args, **kwargs)
+            empty = result is None or (result.empty if isinstance(result, pd.DataFrame) else len(result) == 0)
+            outcome = "empty" if empty else "ok"
+            return result
+        finally:
+            metrics.inc("upstream_requests_total", source=self.name, method=method, outcome=outcome)
+
+    def history(self, ticker_symbol, start, end, interval="1d"):
+        return self._call("history", ticker_symbol, start, end, interval=interval)
+
+    def info(self, ticker_symbol):
+        return self._call("info", ticker_symbol)
+
+    def statement(self, ticker_symbol, name):
+        return self._call("statement", ticker_symbol, name)
+
+    def download(self, tickers, start, end, interval="1d"):
+        return self._call("download", tickers, start, end, interval=interval)
+
+
+FAKE_HISTORY_EPOCH = "2010-01-01"
+
+
+class FakeDataSource:
+    """Deterministic random-walk prices with injected latency and failures."""
+    name = "fake"
+
+    def __init__(self, latency=0.2, jitter=0.0, failure_rate=0.0, slow_tickers=None, slow_latency=30.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.slow_tickers = set(slow_tickers or [])
+        self.slow_latency = slow_latency
+        self.seed = seed
+        self._rng = random.Random(seed)
+
+    def _simulate_call(self, ticker_symbol):
+        delay = self.slow_latency if ticker_symbol in self.slow_tickers else self.latency + self._rng.uniform(0, self.jitter)
+        if delay > 0: time.sleep(delay)
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise RuntimeError(f"Injected upstream failure for {ticker_symbol}")
+
+    def _ticker_rng(self, ticker_symbol):
+        return np.random.default_rng(zlib.crc32(ticker_symbol.encode()) + self.seed)
+
+    def history(self, ticker_symbol, start, end, interval="1d"):
+        self._simulate_call(ticker_symbol)
+        return self._generate_history(ticker_symbol, start, end)
+
+    def _generate_history(self, ticker_symbol, start, end):
+        # The walk always starts at FAKE_HISTORY_EPOCH, so overlapping windows return the same bars.
+        index = pd.bdate_range(start=FAKE_HISTORY_EPOCH, end=end, inclusive="left", name="Date")
+        rng = self._ticker_rng(ticker_symbol)
+        base = rng.uniform(100, 3000)
+        close = base * np.exp(np.cumsum(rng.normal(0, 0.015, len(index))))
+        open_ = close * (1 + rng.normal(0, 0.005, len(index)))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.006, len(index))))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.006, len(index))))
+        volume = rng.integers(100_000, 10_000_000, len(index))
+        df = pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}, index=index)
+        return df[df.index >= pd.Timestamp(start)]
+
+    def download(self, tickers, start, end, interval="1d"):
+        tickers = list(tickers)
+        self._simulate_call(",".join(tickers))
+        frames = {}
+        for ticker_symbol in tickers:
+            if ticker_symbol in self.slow_tickers: continue
+            frames[ticker_symbol] = self._generate_history(ticker_symbol, start, end)
+        if not frames: return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+    def statement(self, ticker_symbol, name):
+        self._simulate_call(ticker_symbol)
+        rng = self._ticker_rng(ticker_symbol + name)
+        quarterly = name.startswith("quarterly_")
+        periods = pd.date_range(end="2026-03-31", periods=5 if quarterly else 4, freq="QE" if quarterly else "YE-MAR")[::-1]
+        rows = ["Total Revenue", "Gross Profit", "Operating Income", "Net Income", "EBITDA", "Total Assets", "Total Debt", "Free Cash Flow"]
+        values = rng.uniform(1e9, 1e12, (len(rows), len(periods)))
+        values[rng.random(values.shape) < 0.05] = np.nan
+        return pd.DataFrame(values, index=rows, columns=periods)
+
+    def info(self, ticker_symbol):
+        self._simulate_call(ticker_symbol)
+        rng = self._ticker_rng(ticker_symbol)
+        previous_close = round(rng.uniform(100, 3000), 2)
+        current_price = round(previous_close * (1 + rng.normal(0, 0.01)), 2)
+        return {
+            "shortName": ticker_symbol.replace(".NS", "") + " LTD",
+            "currentPrice": current_price, "regularMarketPrice": current_price,
+            "previousClose": previous_close, "open": previous_close,
+            "volume": int(rng.integers(100_000, 10_000_000)),
+            "averageVolume": int(rng.integers(100_000, 10_000_000)),
+            "marketCap": int(rng.integers(10**10, 2 * 10**13)), "trailingPE": round(rng.uniform(5, 80), 2),
+            "priceToBook": round(rng.uniform(0.5, 15), 2), "dividendYield": round(rng.uniform(0, 5), 2), "beta": round(rng.uniform(0.4, 1.8), 2),
+        }
+
+
+# --- Recorded Fixtures (replayed by the benchmark suite) ---
+# Layout: <fixture_dir>/<TICKER>/history.csv, info.json and statements/<name>.csv, one directory per ticker.
+
+def record_fixtures(source, tickers, fixture_dir, start, end, statements=()):
+    """Saves daily bars, stock.info and the named statements of each ticker from `source` (live or fake)."""
+    for ticker_symbol in tickers:
+        ticker_dir = os.path.join(fixture_dir, ticker_symbol)
+        os.makedirs(os.path.join(ticker_dir, "statements"), exist_ok=True)
+        history = source.history(ticker_symbol, start, end)
+        if history.index.tz is not None: history.index = history.index.tz_localize(None)
+        history.index = history.index.normalize().rename("Date")
+        history[["Open", "High", "Low", "Close", "Volume"]].to_csv(os.path.join(ticker_dir, "history.csv"))
+        with open(os.path.join(ticker_dir, "info.json"), "w", encoding="utf-8") as f: json.dump(source.info(ticker_symbol) or {}, f, default=str)
+        for name in statements:
+            statement = source.statement(ticker_symbol, name)
+            if statement is not None and not statement.empty: statement.to_csv(os.path.join(ticker_dir, "statements", name + ".csv"))
+        print(f"  Recorded {ticker_symbol}: {len(history)} bars, {len(statements)} statements")
+
+
+class ReplayDataSource(FakeDataSource):
+    """Serves fixtures saved by record_fixtures() with FakeDataSource's injected latency and failures.
+
+    Bars are shifted by whole business days so the last recorded bar lands on today (or the last
+    business day), so an old recording still exercises the closed-bar and today's-bar paths.
+    """
+    name = "replay"
+
+    def __init__(self, fixture_dir, shift_to_today=True, **latency_options):
+        super().__init__(**latency_options)
+        self.fixture_dir = fixture_dir
+        self._history, self._info, self._statements = {}, {}, {}
+        for ticker_symbol in sorted(os.listdir(fixture_dir)):
+            ticker_dir = os.path.join(fixture_dir, ticker_symbol)
+            if not os.path.exists(os.path.join(ticker_dir, "history.csv")): continue
+            self._history[ticker_symbol] = pd.read_csv(os.path.join(ticker_dir, "history.csv"), index_col="Date", parse_dates=["Date"])
+            with open(os.path.join(ticker_dir, "info.json"), encoding="utf-8") as f: self._info[ticker_symbol] = json.load(f)
+            statement_dir = os.path.join(ticker_dir, "statements")
+            for file_name in sorted(os.listdir(statement_dir)) if os.path.isdir(statement_dir) else []:
+                statement = pd.read_csv(os.path.join(statement_dir, file_name), index_col=0)
+                statement.columns = pd.to_datetime(statement.columns)
+                self._statements[(ticker_symbol, file_name[:-4])] = statement
+        if shift_to_today and self._history:
+            last_bar = max(history.index[-1] for history in self._history.values() if not history.empty)
+            shift = len(pd.bdate_range(last_bar, pd.offsets.BDay().rollback(pd.Timestamp.today().normalize()))) - 1
+            for history in self._history.values(): history.index = (history.index + pd.offsets.BDay(shift)).rename("Date")
+
+    @property
+    def tickers(self):
+        return list(self._history)
+
+    def statements(self):
+        return dict(self._statements)
+
+    def _generate_history(self, ticker_symbol, start, end):
+        history = self._history.get(ticker_symbol)
+        if history is None: return pd.DataFrame(columns=["Open", "High", "Low", "Close", "Volume"])
+        return history[(history.index >= pd.Timestamp(start)) & (history.index < pd.Timestamp(end))].copy()
+
+    def statement(self, ticker_symbol, name):
+        self._simulate_call(ticker_symbol)
+        statement = self._statements.get((ticker_symbol, name))
+        return statement.copy() if statement is not None else pd.DataFrame()
+
+    def info(self, ticker_symbol):
+        self._simulate_call(ticker_symbol)
+        return dict(self._info.get(ticker_symbol, {}))
+
+
+# --- Fake Live Quote Feed (for the quote stream harness and benchmarks) ---
+class FakeQuoteSource:
+    """Quote rows shaped like the quick-update payload; each poll moves a random subset of tickers."""
+
+    def __init__(self, tickers, move_fraction=0.3, flip_probability=0.02, seed=0):
+        self.tickers = list(tickers)
+        self.move_fraction = move_fraction
+        self.flip_probability = flip_probability
+        self._rng = random.Random(seed)
+        self.polls = 0
+        self._rows = {}
+        for ticker_symbol in self.tickers:
+            previous_close = round(self._rng.uniform(100, 3000), 2)
+            self._rows[ticker_symbol] = {"ticker": ticker_symbol, "name": ticker_symbol.replace(".NS", ""), "previousClose": previous_close,
+                                         "cmp": previous_close, "dayChangePercent": 0.0, "dayChangeAbs": 0.0,
+                                         "volume": self._rng.randint(100_000, 1_000_000), "dmaSignal": "NEUTRAL / SIDEWAYS", "lastSignalDate": None}
+
+    def quotes(self):
+        self.polls += 1
+        for row in self._rows.values():
+            if self._rng.random() >= self.move_fraction: continue
+            row["cmp"] = round(row["cmp"] * (1 + self._rng.gauss(0, 0.002)), 2)
+            row["dayChangeAbs"] = round(row["cmp"] - row["previousClose"], 2)
+            row["dayChangePercent"] = round(row["dayChangeAbs"] / row["previousClose"] * 100, 2)
+            row["volume"] += self._rng.randint(100, 10_000)
+            if self._rng.random() < self.flip_probability:
+                row["dmaSignal"] = "STRONG BUY" if row["dayChangeAbs"] >= 0 else "STRONG SELL"
+                row["lastSignalDate"] = time.strftime("%Y-%m-%d")
+        return [{k: v for k, v in row.items() if k != "previousClose"} for row in self._rows.values()]
@@ -0,0 +1,301 @@
+# dma_signals.py
+
+import math
+from datetime import date
+
+import numpy as np
+
+# --- DMA Configuration ---
+SHORT_WINDOW = 20
+LONG_WINDOW = 50
+
+# --- DMA Signal Nuance Parameters ---
+RECENT_CROSSOVER_DAYS = 5
+MA_SPREAD_STRONG_THRESHOLD = 0.015
+MA_SPREAD_NEUTRAL_THRESHOLD = 0.005
+
+# --- Signal Codes (index into SIGNAL_LABELS) ---
+SIGNAL_LABELS = (
+    "N/A (Logic)", "N/A (Data)", "INITIAL",
+    "STRONG BUY", "RECENT BUY", "BUY (Uptrend)", "POTENTIAL BUY / RECOVERY",
+    "STRONG SELL", "RECENT SELL", "SELL (Downtrend)", "POTENTIAL SELL / DECLINE",
+    "NEUTRAL / SIDEWAYS",
+)
+(SIG_NA_LOGIC, SIG_NA_DATA, SIG_INITIAL,
+ SIG_STRONG_BUY, SIG_RECENT_BUY, SIG_BUY_UPTREND, SIG_POTENTIAL_BUY,
+ SIG_STRONG_SELL, SIG_RECENT_SELL, SIG_SELL_DOWNTREND, SIG_POTENTIAL_SELL,
+ SIG_NEUTRAL) = range(len(SIGNAL_LABELS))
+
+
+def compact_columns(close):
+    """Moves each column's missing bars to the top so every ticker's bars are contiguous, exactly as
+    in its own single-ticker history. Returns the compacted matrix and the source row of each cell
+    (None when nothing is missing).
+    """
+    missing = np.isnan(close)
+    if not missing.any():
+        return close, None
+    order = np.argsort(~missing, axis=0, kind="stable")
+    return np.take_along_axis(close, order, axis=0), order
+
+
+def rolling_means(values, *windows):
+    """Trailing means over each of `windows` rows with min_periods=1, column-wise.
+
+    A column may start with NaNs (no bars yet) but must have none after its first value.
+    The prefix sum is shared by all windows.
+    """
+    n_rows, n_cols = values.shape
+    if n_rows == 0: return [values.copy() for _ in windows]
+    missing = np.isnan(values)
+    lead = missing.sum(axis=0)
+    # Centre each column on its first value so the running sums stay small.
+    reference = np.where(lead < n_rows, values[np.minimum(lead, n_rows - 1), np.arange(n_cols)], 0.0)
+    centred = values - reference
+    centred[missing] = 0.0
+    prefix = np.cumsum(centred, axis=0)
+    bars_so_far = np.arange(1, n_rows + 1)[:, None] - lead
+    means = []
+    for window in windows:
+        sums = prefix.copy()
+        sums[window:] -= prefix[:-window]
+        counts = np.minimum(bars_so_far, window)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sums /= counts
+        sums += reference
+        sums[counts <= 0] = np.nan
+        means.append(sums)
+    return means
+
+
+def _last_true_index(mask):
+    if mask.shape[0] == 0: return np.full(mask.shape[1], -1)
+    any_true = mask.any(axis=0)
+    last = mask.shape[0] - 1 - np.argmax(mask[::-1], axis=0)
+    return np.where(any_true, last, -1)
+
+
+def classify_dma(s, l, last_buy, last_sell, days_since_buy, days_since_sell, bar_count, long_window=LONG_WINDOW,
+                 recent_days=RECENT_CROSSOVER_DAYS, strong_threshold=MA_SPREAD_STRONG_THRESHOLD,
+                 neutral_threshold=MA_SPREAD_NEUTRAL_THRESHOLD):
+    """Signal codes from the latest DMA state of each ticker (all arguments are 1-D arrays).
+
+    last_buy/last_sell are increasing event positions (row indices or day numbers), -1 for none.
+    Returns (signal, signal_event, ma_spread) where signal_event is the last_buy/last_sell value
+    the signal date comes from, or -1.
+    """
+    s, l = np.asarray(s, dtype="f8"), np.asarray(l, dtype="f8")
+    last_buy, last_sell, bar_count = np.asarray(last_buy), np.asarray(last_sell), np.asarray(bar_count)
+    days_since_buy, days_since_sell = np.asarray(days_since_buy, dtype="f8"), np.asarray(days_since_sell, dtype="f8")
+    both_valid = ~np.isnan(s) & ~np.isnan(l)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ma_spread = np.where(both_valid & (l != 0), (s - l) / np.where(l != 0, l, 1.0), 0.0)
+
+    buy_leads = (last_buy >= 0) & ((last_sell < 0) | (last_buy > last_sell))
+    sell_leads = (last_sell >= 0) & ((last_buy < 0) | (last_sell > last_buy))
+    recent_buy, recent_sell = days_since_buy <= recent_days, days_since_sell <= recent_days
+    latest_event = np.maximum(last_buy, last_sell)
+
+    up, down = both_valid & (s > l), both_valid & (s < l)
+    signal = np.select(
+        [up & buy_leads & recent_buy & (ma_spread >= strong_threshold), up & buy_leads & recent_buy, up & buy_leads, up,
+         down & sell_leads & recent_sell & (np.abs(ma_spread) >= strong_threshold), down & sell_leads & recent_sell, down & sell_leads, down,
+         both_valid],
+        [SIG_STRONG_BUY, SIG_RECENT_BUY, SIG_BUY_UPTREND, SIG_POTENTIAL_BUY,
+         SIG_STRONG_SELL, SIG_RECENT_SELL, SIG_SELL_DOWNTREND, SIG_POTENTIAL_SELL,
+         SIG_NEUTRAL],
+        default=SIG_NA_LOGIC)
+    signal_event = np.select([up & buy_leads, down & sell_leads, both_valid & ~up & ~down], [last_buy, last_sell, latest_event], default=-1)
+
+    # A thin spread overrides the trend unless a fresh strong crossover just happened.
+    fresh_strong = np.isin(signal, (SIG_STRONG_BUY, SIG_STRONG_SELL)) & (recent_buy | recent_sell)
+    flatten = both_valid & (np.abs(ma_spread) < neutral_threshold) & ~fresh_strong
+    signal = np.where(flatten, SIG_NEUTRAL, signal)
+    signal_event = np.where(flatten, latest_event, signal_event)
+
+    # Every bar has both SMAs (min_periods=1), so the bar count is also the count of valid SMA rows.
+    signal = np.where(bar_count == 1, SIG_INITIAL, signal)
+    signal = np.where(bar_count == 0, SIG_NA_LOGIC, signal)
+    signal_event = np.where(bar_count < 2, -1, signal_event)
+    signal = np.where(bar_count < long_window, SIG_NA_DATA, signal)
+    signal_event = np.where(bar_count < long_window, -1, signal_event)
+    return signal, signal_event, ma_spread
+
+
+def compute_dma_signals(close, dates, today=None, short_window=SHORT_WINDOW, long_window=LONG_WINDOW,
+                        recent_days=RECENT_CROSSOVER_DAYS, strong_threshold=MA_SPREAD_STRONG_THRESHOLD,
+                        neutral_threshold=MA_SPREAD_NEUTRAL_THRESHOLD):
+    """Classify every column of a dates x tickers close matrix in one pass.
+
+    `close` is a 2-D float array (NaN where a ticker has no bar), `dates` the matching ascending
+    datetime64 row labels. Row indices in the result refer to rows of `close`; -1 means none.
+    """
+    close = np.asarray(close, dtype="f8")
+    if close.ndim == 1: close = close[:, None]
+    dates = np.asarray(dates).astype("datetime64[D]")
+    today = np.datetime64(today or date.today(), "D")
+    n_rows, n_cols = close.shape
+    cols = np.arange(n_cols)
+
+    compact, order = compact_columns(close)
+    bar_count = (~np.isnan(close)).sum(axis=0)
+    sma_short, sma_long = rolling_means(compact, short_window, long_window)
+
+    # Crossovers compare each bar with the ticker's previous bar (NaN rows never cross).
+    prev_short, prev_long = np.full_like(sma_short, np.nan), np.full_like(sma_long, np.nan)
+    prev_short[1:], prev_long[1:] = sma_short[:-1], sma_long[:-1]
+    buy_cross = (sma_short > sma_long) & (prev_short <= prev_long)
+    sell_cross = (sma_short < sma_long) & (prev_short >= prev_long)
+    last_buy, last_sell = _last_true_index(buy_cross), _last_true_index(sell_cross)
+
+    to_source = (lambda idx: np.where(idx >= 0, order[np.maximum(idx, 0), cols], -1)) if order is not None else (lambda idx: idx)
+    last_buy, last_sell = to_source(last_buy), to_source(last_sell)
+
+    def days_since(idx):
+        days = (today - dates[np.maximum(idx, 0)]).astype("f8") if n_rows else np.zeros(n_cols)
+        return np.where(idx >= 0, days, np.inf)
+    days_since_buy, days_since_sell = days_since(last_buy), days_since(last_sell)
+
+    s, l = (sma_short[-1], sma_long[-1]) if n_rows else (np.full(n_cols, np.nan), np.full(n_cols, np.nan))
+    signal, signal_row, ma_spread = classify_dma(s, l, last_buy, last_sell, days_since_buy, days_since_sell, bar_count,
+                                                 long_window, recent_days, strong_threshold, neutral_threshold)
+
+    if order is not None:
+        sma_short_out, sma_long_out = np.full_like(sma_short, np.nan), np.full_like(sma_long, np.nan)
+        np.put_along_axis(sma_short_out, order, sma_short, axis=0)
+        np.put_along_axis(sma_long_out, order, sma_long, axis=0)
+        sma_short, sma_long = sma_short_out, sma_long_out
+
+    return {
+        "smaShort": sma_short, "smaLong": sma_long,
+        "smaShortLatest": s, "smaLongLatest": l, "barCount": bar_count,
+        "lastBuyIndex": last_buy, "lastSellIndex": last_sell,
+        "daysSinceBuy": days_since_buy, "daysSinceSell": days_since_sell,
+        "maSpread": ma_spread, "signal": signal, "signalIndex": signal_row,
+    }
+
+
+# --- Incremental Per-ticker DMA State ---
+class _RunningMean:
+    """Ring buffer and running sum for one trailing window (min_periods=1)."""
+    RESYNC_EVERY = 1024 # Re-add the buffer now and then so float error in the running sum cannot build up
+
+    def __init__(self, window):
+        self.window = window
+        self._values = []
+        self._next = 0
+        self._sum = 0.0
+        self._pushes = 0
+        self._reference = None
+
+    def _peek_sum(self, value):
+        if len(self._values) < self.window: return self._sum + value, len(self._values) + 1
+        return self._sum + value - self._values[self._next], self.window
+
+    def peek(self, value):
+        # Mean if `value` were pushed, without changing state.
+        reference = value if self._reference is None else self._reference
+        total, count = self._peek_sum(value - reference)
+        return total / count + reference
+
+    def push(self, value):
+        if self._reference is None: self._reference = value
+        value -= self._reference
+        self._sum, count = self._peek_sum(value)
+        if len(self._values) < self.window: self._values.append(value)
+        else:
+            self._values[self._next] = value
+            self._next = (self._next + 1) % self.window
+        self._pushes += 1
+        if self._pushes % self.RESYNC_EVERY == 0: self._sum = math.fsum(self._values)
+        return self._sum / count + self._reference
+
+
+class IncrementalDMA:
+    """SMA and crossover state for one ticker, updated in O(1) per bar.
+
+    add_bar() appends a closed daily bar; update_provisional() sets today's still-moving close,
+    which signal() then includes without changing the closed-bar state. Fed the same closed
+    bars, it yields the same signal as compute_dma_signals.
+    """
+
+    def __init__(self, short_window=SHORT_WINDOW, long_window=LONG_WINDOW, recent_days=RECENT_CROSSOVER_DAYS,
+                 strong_threshold=MA_SPREAD_STRONG_THRESHOLD, neutral_threshold=MA_SPREAD_NEUTRAL_THRESHOLD):
+        self.long_window = long_window
+        self.thresholds = (recent_days, strong_threshold, neutral_threshold)
+        self._short = _RunningMean(short_window)
+        self._long = _RunningMean(long_window)
+        self.bar_count = 0
+        self.last_date = None
+        self.last_close = np.nan
+        self.sma_short = self.sma_long = np.nan
+        self.last_buy = self.last_sell = -1 # day numbers (datetime64[D] as int), -1 for none
+        self._provisional = None
+
+    @classmethod
+    def from_history(cls, dates, closes, **params):
+        state = cls(**params)
+        for bar_date, close in zip(np.asarray(dates).astype("datetime64[D]"), np.asarray(closes, dtype="f8")):
+            state.add_bar(bar_date, close)
+        return state
+
+    def _crossed(self, day, sma_short, sma_long):
+        last_buy, last_sell = self.last_buy, self.last_sell
+        if self.bar_count > 0:
+            if sma_short > sma_long and self.sma_short <= self.sma_long: last_buy = day
+            elif sma_short < sma_long and self.sma_short >= self.sma_long: last_sell = day
+        return last_buy, last_sell
+
+    def add_bar(self, bar_date, close):
+        if np.isnan(close): return
+        day = int(np.datetime64(bar_date, "D").astype(int))
+        if self.last_date is not None and day <= self.last_date:
+            raise ValueError(f"Bars must be added in date order (got {np.datetime64(bar_date, 'D')} after {np.datetime64(self.last_date, 'D')})")
+        sma_short, sma_long = self._short.push(float(close)), self._long.push(float(close))
+        self.last_buy, self.last_sell = self._crossed(day, sma_short, sma_long)
+        self.sma_short, self.sma_long = sma_short, sma_long
+        self.bar_count += 1
+        self.last_date = day
+        self.last_close = float(close)
+        if self._provisional is not None and self._provisional["day"] <= day: self._provisional = None
+
+    def update_provisional(self, bar_date, close):
+        day = int(np.datetime64(bar_date, "D").astype(int))
+        if np.isnan(close) or (self.last_date is not None and day <= self.last_date):
+            self._provisional = None
+            return
+        sma_short, sma_long = self._short.peek(float(close)), self._long.peek(float(close))
+        last_buy, last_sell = self._crossed(day, sma_short, sma_long)
+        self._provisional = {"day": day, "sma_short": sma_short, "sma_long": sma_long, "last_buy": last_buy, "last_sell": last_sell}
+
+    def signal(self, today=None, include_provisional=True):
+        """(signal code, signal date or None, latest SMA short, latest SMA long)."""
+        state = self._provisional if include_provisional else None
+        if state is None:
+            state = {"sma_short": self.sma_short, "sma_long": self.sma_long, "last_buy": self.last_buy, "last_sell": self.last_sell}
+            bar_count = self.bar_count
+        else:
+            bar_count = self.bar_count + 1
+        today_day = int(np.datetime64(today or date.today(), "D").astype(int))
+        days_since = lambda day: today_day - day if day >= 0 else np.inf
+        recent_days, strong_threshold, neutral_threshold = self.thresholds
+        signal, event, _ = classify_dma([state["sma_short"]], [state["sma_long"]], [state["last_buy"]], [state["last_sell"]],
+                                        [days_since(state["last_buy"])], [days_since(state["last_sell"])], [bar_count],
+                                        self.long_window, recent_days, strong_threshold, neutral_threshold)
+        signal_date = np.datetime64(int(event[0]), "D").astype(date) if event[0] >= 0 else None
+        if signal[0] == SIG_NA_DATA: return int(signal[0]), None, np.nan, np.nan
+        return int(signal[0]), signal_date, state["sma_short"], state["sma_long"]
+
+
+# --- Scaling Benchmark ---
+if __name__ == '__main__':
+    import time
+
+    rng = np.random.default_rng(0)
+    dates = np.arange(np.datetime64(date.today()) - 300, np.datetime64(date.today()), dtype="datetime64[D]")
+    for n_tickers in (50, 500, 3000):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (len(dates), n_tickers)), axis=0))
+        close[:rng.integers(0, 100), ::7] = np.nan # late listings
+        start = time.perf_counter()
+        compute_dma_signals(close, dates)
+        print(f"{n_tickers:>5} tickers x {len(dates)} bars: {(time.perf_counter() - start) * 1000:7.1f} ms")
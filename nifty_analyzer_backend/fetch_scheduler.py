@@ -0,0 +1,126 @@
+# fetch_scheduler.py
+
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# --- Fetch Scheduler Configuration ---
+FETCH_MAX_WORKERS = int(os.environ.get("FETCH_MAX_WORKERS", "8"))
+FETCH_TIMEOUT_SECONDS = float(os.environ.get("FETCH_TIMEOUT_SECONDS", "20"))
+FETCH_RATE_PER_SECOND = float(os.environ.get("FETCH_RATE_PER_SECOND", "10"))
+FETCH_RATE_BURST = int(os.environ.get("FETCH_RATE_BURST", "10"))
+
+
+# --- Token Bucket Rate Limiter ---
+class TokenBucket:
+    """Blocking token bucket, safe to share between threads."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1, rate))
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate
+            self._sleep(wait_seconds)
+
+
+# One bucket per process: concurrent fan-outs (requests, prewarm ticks) share the upstream budget
+# instead of each getting a fresh burst.
+upstream_rate_limiter = TokenBucket(FETCH_RATE_PER_SECOND, FETCH_RATE_BURST) if FETCH_RATE_PER_SECOND > 0 else None
+
+def default_rate_limiter():
+    return upstream_rate_limiter
+
+
+# --- Error Marker for Partial Results ---
+def error_marker(ticker_symbol, message):
+    return {"ticker": ticker_symbol, "name": ticker_symbol.replace(".NS", ""), "cmp": None, "dayChangePercent": None, "dayChangeAbs": None, "volume": None, "error": True, "errorMessage": message}
+
+
+# --- Bounded Parallel Fan-Out ---
+def fetch_many(tickers, fetch_fn, max_workers=None, timeout=None, rate_limiter=None, on_error=error_marker):
+    """Run fetch_fn(ticker) for every ticker with bounded parallelism.
+
+    Returns results in the same order as tickers. A ticker that raises, returns None or runs
+    longer than `timeout` seconds (measured from when its worker picked it up) is replaced by
+    on_error(ticker, message) instead of failing the whole batch.
+    """
+    max_workers = max_workers or FETCH_MAX_WORKERS
+    timeout = timeout if timeout is not None else FETCH_TIMEOUT_SECONDS
+    tickers = list(tickers)
+    started = {}
+    results = {}
+
+    def run(ticker):
+        if rate_limiter is not None: rate_limiter.acquire()
+        started[ticker] = time.monotonic()
+        return fetch_fn(ticker)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers) or 1)), thread_name_prefix="fetch")
+    # Each worker runs in a copy of the caller's context, so request-scoped state (e.g. the profiling trace) follows it.
+    futures = {executor.submit(contextvars.copy_context().run, run, ticker): ticker for ticker in tickers}
+    pending = set(futures)
+    try:
+        while pending:
+            now = time.monotonic()
+            deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+            poll = min([0.1] + [max(0.0, d - now) for d in deadlines])
+            done, pending = wait(pending, timeout=poll, return_when=FIRST_COMPLETED)
+            for future in done:
+                ticker = futures[future]
+                try:
+                    result = future.result()
+                    results[ticker] = result if result is not None else on_error(ticker, "No data returned")
+                except Exception as e:
+                    print(f"  ERROR: Fetch failed for {ticker}: {e}")
+                    results[ticker] = on_error(ticker, str(e))
+            now = time.monotonic()
+            for future in list(pending):
+                ticker = futures[future]
+                if ticker in started and now - started[ticker] >= timeout:
+                    print(f"  WARN: Fetch for {ticker} timed out after {timeout:.1f}s")
+                    pending.discard(future)
+                    results[ticker] = on_error(ticker, f"Timed out after {timeout:.1f}s")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return [results[ticker] for ticker in tickers]
+
+
+# --- Offline Benchmark ---
+if __name__ == '__main__':
+    from data_sources import FakeDataSource
+    from screener import load_universe, DEFAULT_UNIVERSE
+    NIFTY50_TICKERS = load_universe(DEFAULT_UNIVERSE)
+
+    fake = FakeDataSource(latency=0.2, jitter=0.1, slow_tickers=NIFTY50_TICKERS[:2], slow_latency=5.0)
+    for workers in (1, 4, 8, 16):
+        start = time.time()
+        rows = fetch_many(NIFTY50_TICKERS, fake.info, max_workers=workers, timeout=2.0, rate_limiter=TokenBucket(50, 50))
+        errors = sum(1 for row in rows if row.get("error"))
+        print(f"workers={workers:>2}  {time.time() - start:6.2f}s  ok={len(rows) - errors}  errors={errors}")
@@ -0,0 +1,188 @@
+# history_loader.py
+
+import os
+import time
+import threading
+from datetime import datetime, timedelta, date
+
+import pandas as pd
+
+from single_flight import SingleFlight
+
+# --- History Loader Configuration ---
+UNIVERSE_HISTORY_DAYS = 365 * 2 + 60 # Widest window any endpoint reads (the detail chart)
+HISTORY_REFRESH_SECONDS = int(os.environ.get("HISTORY_REFRESH_SECONDS", str(15 * 60)))
+QUOTE_REFRESH_SECONDS = int(os.environ.get("QUOTE_REFRESH_SECONDS", "15"))
+FORCED_QUOTE_REFRESH_SECONDS = float(os.environ.get("FORCED_QUOTE_REFRESH_SECONDS", "5")) # A forced refresh reuses a tail this fresh
+QUOTE_TAIL_DAYS = 7
+UPSTREAM_RETRY_SECONDS = 60 # While the upstream is failing, retry at most this often
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+ADJUSTMENT_TOLERANCE = 0.005 # Stored vs re-fetched close mismatch that signals a split/dividend adjustment
+
+
+def _normalize_frame(df):
+    # An empty download still gets the Date index and OHLCV columns, so date filters and column picks work on it.
+    if df is None or df.empty: return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name="Date"), dtype="f8")
+    df = df.copy()
+    if getattr(df.index, "tz", None) is not None: df.index = df.index.tz_localize(None)
+    df.index = pd.DatetimeIndex(df.index).normalize()
+    df.index.name = "Date"
+    return df[~df.index.duplicated(keep="last")].sort_index()
+
+
+# --- Universe-wide OHLCV Frame ---
+class HistoryLoader:
+    """Holds one wide OHLCV frame (columns are (ticker, field)) for the whole universe.
+
+    The frame is fetched with a single bulk download and refreshed at most every
+    HISTORY_REFRESH_SECONDS; quote refreshes only re-download the last few days and splice
+    them in. All endpoints read per-ticker slices of the same frame.
+
+    With a store (ohlcv_store.OHLCVStore) closed bars are persisted on disk: a refresh only
+    downloads bars after the last stored date, a restart warm-starts from disk, and the
+    stored bars are served as-is when the upstream download fails.
+    """
+
+    def __init__(self, tickers, source, lookback_days=UNIVERSE_HISTORY_DAYS, store=None):
+        self.tickers = list(tickers)
+        self.source = source
+        self.lookback_days = lookback_days
+        self.store = store
+        self._frame = pd.DataFrame()
+        self._loaded_at = 0.0
+        self._tail_loaded_at = 0.0
+        self._generations = {} # ticker -> bumped each time its history is re-adjusted (split/dividend)
+        self._lock = threading.RLock() # Guards the frame and timestamps; never held across the quote tail download
+        self._tail_flight = SingleFlight()
+
+    def history_generation(self, ticker_symbol):
+        """Changes whenever the ticker's past bars were replaced by re-adjusted ones, so state derived from them must be rebuilt."""
+        return self._generations.get(ticker_symbol, 0)
+
+    def _download(self, start, tickers=None):
+        tickers = tickers or self.tickers
+        end = datetime.now() + timedelta(days=1) # end is exclusive upstream; include today's bar
+        print(f"  Bulk history download for {len(tickers)} tickers from {pd.Timestamp(start):%Y-%m-%d}")
+        return _normalize_frame(self.source.download(tickers, start=pd.Timestamp(start).strftime('%Y-%m-%d'), end=end.strftime('%Y-%m-%d')))
+
+    def _window_start(self):
+        return pd.Timestamp(datetime.now() - timedelta(days=self.lookback_days)).normalize()
+
+    # --- Disk store helpers ---
+    def _store_frame(self):
+        start = self._window_start()
+        frames = {t: self.store.load(t, start) for t in self.tickers}
+        frames = {t: df for t, df in frames.items() if not df.empty}
+        return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+    def _persist_closed_bars(self, fresh):
+        """Append closed bars from a download to the store; returns tickers whose history was re-adjusted."""
+        readjusted = []
+        if self.store is None or fresh.empty: return readjusted
+        today = pd.Timestamp(date.today())
+        for ticker_symbol in fresh.columns.get_level_values(0).unique():
+            closed = fresh[ticker_symbol].dropna(subset=["Close"])
+            closed = closed[closed.index < today]
+            last = self.store.last_bar(ticker_symbol)
+            if last is not None:
+                last_date = pd.Timestamp(last["date"])
+                if last_date in closed.index:
+                    stored_close, fetched_close = float(last["Close"]), float(closed.loc[last_date, "Close"])
+                    if stored_close and abs(fetched_close / stored_close - 1) > ADJUSTMENT_TOLERANCE:
+                        readjusted.append(ticker_symbol)
+                        continue
+            self.store.append(ticker_symbol, closed)
+        return readjusted
+
+    def _load_incremental(self):
+        window_start = self._window_start()
+        if self.store is None: return self._download(window_start)
+        last_dates = {t: self.store.last_date(t) for t in self.tickers}
+        cold = [t for t, d in last_dates.items() if d is None or d < window_start]
+        warm = [t for t in self.tickers if t not in cold]
+        downloads = []
+        if warm:
+            # Start at the oldest last-stored date so every ticker overlaps by one bar (adjustment check).
+            downloads.append(self._download(min(last_dates[t] for t in warm), warm))
+        if cold:
+            for t in cold: self.store.reset(t)
+            downloads.append(self._download(window_start, cold))
+        fresh = pd.concat([df for df in downloads if not df.empty], axis=1) if any(not df.empty for df in downloads) else pd.DataFrame()
+        readjusted = self._persist_closed_bars(fresh)
+        if readjusted:
+            print(f"  Price adjustment detected for {readjusted}; re-downloading their history")
+            for t in readjusted:
+                self.store.reset(t)
+                self._generations[t] = self._generations.get(t, 0) + 1
+            refetched = self._download(window_start, readjusted)
+            self._persist_closed_bars(refetched)
+            fresh = refetched.combine_first(fresh) if not fresh.empty else refetched
+        return self._with_provisional_bars(self._store_frame(), fresh)
+
+    def _with_provisional_bars(self, frame, fresh):
+        # Today's bar is still moving, so it lives only in memory and is never persisted.
+        if self.store is None: return fresh.combine_first(frame) if not frame.empty else fresh
+        if fresh.empty: return frame
+        provisional = fresh[fresh.index >= pd.Timestamp(date.today())]
+        if provisional.empty: return frame
+        return provisional.combine_first(frame) if not frame.empty else provisional
+
+    def frame(self, force_refresh=False):
+        with self._lock:
+            if force_refresh or self._frame.empty or time.time() - self._loaded_at >= HISTORY_REFRESH_SECONDS:
+                try:
+                    fresh = self._load_incremental()
+                    if not fresh.empty:
+                        self._frame, self._loaded_at = fresh, time.time()
+                        self._tail_loaded_at = self._loaded_at
+                except Exception as e:
+                    print(f"  ERROR: Bulk history download failed: {e}")
+                    if self._frame.empty and self.store is not None:
+                        print("  Serving stored history from disk")
+                        self._frame = self._store_frame()
+                    if self._frame.empty: raise
+                    self._loaded_at = time.time() - max(0, HISTORY_REFRESH_SECONDS - UPSTREAM_RETRY_SECONDS)
+                    self._tail_loaded_at = time.time()
+            return self._frame
+
+    def _tail_is_fresh(self, max_age):
+        with self._lock: return time.time() - self._tail_loaded_at < max_age
+
+    def refresh_quotes(self, force_refresh=False):
+        # Re-download only the last few days and splice them over the existing frame. Readers keep the
+        # previous frame during the download; concurrent refreshes join the one in flight.
+        frame = self.frame()
+        if self._tail_is_fresh(FORCED_QUOTE_REFRESH_SECONDS if force_refresh else QUOTE_REFRESH_SECONDS): return frame
+        return self._tail_flight.do("tail", self._refresh_tail)
+
+    def _refresh_tail(self):
+        # A refresh that checked just before the previous one finished finds its tail fresh here.
+        if self._tail_is_fresh(FORCED_QUOTE_REFRESH_SECONDS): return self._frame
+        try:
+            tail = self._download(datetime.now() - timedelta(days=QUOTE_TAIL_DAYS))
+        except Exception as e:
+            print(f"  WARN: Quote tail download failed, serving previous bars: {e}")
+            with self._lock:
+                self._tail_loaded_at = time.time()
+                return self._frame
+        with self._lock:
+            if not tail.empty:
+                if self._persist_closed_bars(tail): self._loaded_at = 0.0 # re-adjusted history: reload on next read
+                frame = self._frame # may have been reloaded during the download; the tail is at least as new
+                self._frame = tail.combine_first(frame)[frame.columns.union(tail.columns)]
+                self._tail_loaded_at = time.time()
+            return self._frame
+
+    def ticker_history(self, ticker_symbol, start=None, end=None):
+        """Daily OHLCV for one ticker, optionally limited to start <= date < end."""
+        frame = self.frame()
+        if ticker_symbol in frame.columns.get_level_values(0):
+            hist_df = frame[ticker_symbol].dropna(subset=["Close"])
+        else:
+            # Outside the universe: fall back to a single-ticker request.
+            fetch_start = start or (datetime.now() - timedelta(days=self.lookback_days))
+            hist_df = _normalize_frame(self.source.history(ticker_symbol, start=pd.Timestamp(fetch_start).strftime('%Y-%m-%d'),
+                                                           end=(datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')))
+        if start is not None: hist_df = hist_df[hist_df.index >= pd.Timestamp(start).normalize()]
+        if end is not None: hist_df = hist_df[hist_df.index < pd.Timestamp(end).normalize()]
+        return hist_df[[c for c in OHLCV_COLUMNS if c in hist_df.columns]]
@@ -0,0 +1,155 @@
+# metrics.py
+
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+
+# --- Metrics Configuration ---
+PROFILE_HEADER_ENABLED = os.environ.get("PROFILE_HEADER_ENABLED", "1") == "1" # Requests sending `X-Profile: 1` get a Server-Timing header
+PROFILE_REQUEST_HEADER = "X-Profile"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # Seconds
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRIC_HELP = {
+    "http_request_duration_seconds": "Request latency per endpoint (time to response headers for streams).",
+    "stage_duration_seconds": "Duration of instrumented backend stages (upstream calls, indicators, serialization, cache lookups).",
+    "upstream_requests_total": "Upstream data source calls by method and outcome (ok, empty, error).",
+    "cache_lookups_total": "Cache lookups by data class and result (memory hit, shared hit, miss).",
+}
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs: return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number_text(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# --- Process-local Counters and Histograms ---
+class MetricsRegistry:
+    """Counters and fixed-bucket histograms, rendered in the Prometheus text format.
+
+    Labels are kept low-cardinality (endpoint rule, stage, data class, upstream method); per-ticker
+    labels would grow without bound. Collectors registered with register_collector() are read at
+    scrape time, for stats that other components already keep.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}   # name -> {labels: value}
+        self._histograms = {} # name -> {labels: [per-bucket counts..., +Inf count, sum]}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = tuple(sorted(labels.items()))
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None: counts = series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bucket] += 1
+            counts[-1] += seconds
+
+    def register_collector(self, collect_fn):
+        """collect_fn() -> [(name, type, help, [(labels dict, value)])]"""
+        self._collectors.append(collect_fn)
+
+    def counter_value(self, name, **labels):
+        with self._lock: return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def histogram_totals(self, name):
+        """{labels dict as tuple: (count, seconds)} of one histogram."""
+        with self._lock: return {key: (sum(counts[:-1]), counts[-1]) for key, counts in self._histograms.get(name, {}).items()}
+
+    def render(self):
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {key: list(counts) for key, counts in series.items()} for name, series in self._histograms.items()}
+        lines = []
+        for name in sorted(counters):
+            lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} counter"]
+            lines += [f"{name}{_label_text(key)} {_number_text(value)}" for key, value in sorted(counters[name].items())]
+        for name in sorted(histograms):
+            lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            for key, counts in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_text(key, [('le', bound)])} {cumulative}")
+                lines += [f"{name}_sum{_label_text(key)} {counts[-1]!r}", f"{name}_count{_label_text(key)} {cumulative}"]
+        for collect_fn in self._collectors:
+            try:
+                for name, kind, help_text, samples in collect_fn():
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                    lines += [f"{name}{_label_text(sorted(labels.items()))} {_number_text(value)}" for labels, value in samples if value is not None]
+            except Exception as e: print(f"  WARN: Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+# --- Timing Spans ---
+# The current request's trace (a list of (stage, seconds)) when it asked for profiling, else None.
+# fetch_many copies the context into its workers, so parallel upstream calls land in the same trace.
+_current_trace = ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def span(stage):
+    """Times a stage into stage_duration_seconds{stage} and, when profiling, the request's trace."""
+    start = time.perf_counter()
+    try: yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("stage_duration_seconds", elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None: trace.append((stage, elapsed))
+
+
+def server_timing(trace, total_seconds):
+    """Server-Timing header value: time and call count per stage, plus the request total."""
+    stages = {}
+    for stage, elapsed in trace:
+        count, seconds = stages.get(stage, (0, 0.0))
+        stages[stage] = (count + 1, seconds + elapsed)
+    parts = [f'{stage};dur={seconds * 1000:.2f};desc="{count}x"' for stage, (count, seconds) in sorted(stages.items(), key=lambda item: -item[1][1])]
+    return ", ".join(parts + [f"total;dur={total_seconds * 1000:.2f}"])
+
+
+# --- Flask Request Hooks ---
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    profiling = PROFILE_HEADER_ENABLED and request.headers.get(PROFILE_REQUEST_HEADER, "").lower() in ("1", "true")
+    _current_trace.set([] if profiling else None)
+
+
+def record_request(response):
+    """after_request hook: per-endpoint latency histogram and, when profiling, the Server-Timing header.
+    Registered before compress_response so compression is included in both."""
+    started = g.pop("request_started", None)
+    if started is None: return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.observe("http_request_duration_seconds", elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    trace = _current_trace.get()
+    if trace is not None:
+        response.headers["Server-Timing"] = server_timing(trace, elapsed)
+        _current_trace.set(None)
+    return response
@@ -0,0 +1,76 @@
+# ohlcv_store.py
+
+import os
+import threading
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+# --- Store Configuration ---
+OHLCV_DATA_DIR = os.environ.get("OHLCV_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ohlcv"))
+
+# One fixed-size record per daily bar. Files are raw record arrays, so new bars are appended
+# to the end and reads are a read-only np.memmap of the whole file.
+BAR_DTYPE = np.dtype([("date", "<M8[D]"), ("Open", "<f8"), ("High", "<f8"), ("Low", "<f8"), ("Close", "<f8"), ("Volume", "<f8")])
+BAR_FIELDS = list(BAR_DTYPE.names[1:])
+
+
+# --- Per-ticker Append-only OHLCV Store ---
+class OHLCVStore:
+    def __init__(self, data_dir=OHLCV_DATA_DIR):
+        self.data_dir = data_dir
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def path(self, ticker_symbol):
+        return os.path.join(self.data_dir, quote(ticker_symbol, safe="") + ".ohlcv")
+
+    def tickers(self):
+        return sorted(unquote(name[:-len(".ohlcv")]) for name in os.listdir(self.data_dir) if name.endswith(".ohlcv"))
+
+    def bars(self, ticker_symbol):
+        path = self.path(ticker_symbol)
+        count = os.path.getsize(path) // BAR_DTYPE.itemsize if os.path.exists(path) else 0
+        if count == 0: return np.empty(0, dtype=BAR_DTYPE)
+        # A torn final record from an interrupted append is ignored by sizing the map to whole records.
+        return np.memmap(path, dtype=BAR_DTYPE, mode="r", shape=(count,))
+
+    def last_bar(self, ticker_symbol):
+        bars = self.bars(ticker_symbol)
+        return bars[-1] if len(bars) else None
+
+    def last_date(self, ticker_symbol):
+        bar = self.last_bar(ticker_symbol)
+        return pd.Timestamp(bar["date"]) if bar is not None else None
+
+    def load(self, ticker_symbol, start=None):
+        bars = self.bars(ticker_symbol)
+        if start is not None and len(bars):
+            bars = bars[np.searchsorted(bars["date"], np.datetime64(pd.Timestamp(start).normalize(), "D")):]
+        index = pd.DatetimeIndex(np.asarray(bars["date"]).astype("datetime64[ns]"), name="Date")
+        return pd.DataFrame({field: np.asarray(bars[field]) for field in BAR_FIELDS}, index=index)
+
+    def append(self, ticker_symbol, df):
+        """Append bars dated after the last stored bar; returns how many were written."""
+        if df is None or df.empty: return 0
+        with self._lock:
+            last = self.last_date(ticker_symbol)
+            df = df.dropna(subset=["Close"])
+            if last is not None: df = df[df.index > last]
+            if df.empty: return 0
+            records = np.empty(len(df), dtype=BAR_DTYPE)
+            records["date"] = df.index.values.astype("datetime64[D]")
+            for field in BAR_FIELDS:
+                records[field] = df[field].to_numpy(dtype="f8") if field in df.columns else np.nan
+            path = self.path(ticker_symbol)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(path, "r+b" if size else "wb") as f:
+                f.seek(size - size % BAR_DTYPE.itemsize) # overwrite any torn trailing record
+                records.tofile(f)
+                f.truncate()
+            return len(records)
+
+    def reset(self, ticker_symbol):
+        with self._lock:
+            if os.path.exists(self.path(ticker_symbol)): os.remove(self.path(ticker_symbol))
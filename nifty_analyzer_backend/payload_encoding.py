@@ -0,0 +1,56 @@
+# payload_encoding.py
+
+import gzip
+
+from flask import request, jsonify, Response
+
+from metrics import span
+
+# Optional encoders: used when installed, otherwise requests fall back to JSON / gzip.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# --- Encoding Configuration ---
+COMPRESS_MIN_BYTES = 1024 # Smaller bodies are not worth the CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+MSGPACK_MIMETYPE = "application/msgpack"
+
+
+def _accepts(header_value, token):
+    return any(part.split(";")[0].strip().lower() == token for part in (header_value or "").split(","))
+
+
+def encode_payload(payload, status=200):
+    """JSON response, or msgpack when the client sends `Accept: application/msgpack` and msgpack is installed."""
+    with span("serialize"):
+        if msgpack is not None and _accepts(request.headers.get("Accept"), MSGPACK_MIMETYPE):
+            return Response(msgpack.packb(payload, use_bin_type=True, default=str), status=status, mimetype=MSGPACK_MIMETYPE)
+        return jsonify(payload), status
+
+
+def negotiate_content_encoding(accept_encoding):
+    if brotli is not None and _accepts(accept_encoding, "br"): return "br"
+    if _accepts(accept_encoding, "gzip"): return "gzip"
+    return None
+
+
+def compress_response(response):
+    """after_request hook: brotli/gzip buffered JSON and msgpack bodies per the client's Accept-Encoding."""
+    if response.direct_passthrough or response.is_streamed or response.status_code < 200 or response.status_code >= 300: return response
+    if "Content-Encoding" in response.headers or response.mimetype not in ("application/json", MSGPACK_MIMETYPE): return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_content_encoding(request.headers.get("Accept-Encoding"))
+    body = response.get_data()
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES: return response
+    with span("compress"):
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY) if encoding == "br" else gzip.compress(body, compresslevel=GZIP_LEVEL)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,125 @@
+# prewarm.py
+
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone, time as dtime
+
+# --- Prewarm Configuration ---
+PREWARM_ENABLED = os.environ.get("PREWARM_ENABLED", "1") == "1"
+PREWARM_INTERVAL_SECONDS = int(os.environ.get("PREWARM_INTERVAL_SECONDS", "15"))
+PREWARM_DETAIL_TICKERS = int(os.environ.get("PREWARM_DETAIL_TICKERS", "5")) # Most-requested detail pages kept warm
+
+# --- NSE Trading Hours ---
+IST = timezone(timedelta(hours=5, minutes=30), "IST")
+MARKET_OPEN = dtime(9, 15)
+MARKET_CLOSE = dtime(15, 30)
+EOD_REFRESH_AT = dtime(16, 0) # Daily bars are final upstream by then
+MAX_IDLE_SECONDS = 60 * 60 # Re-check the clock at least hourly while idle
+
+
+def ist_now():
+    return datetime.now(IST)
+
+
+def is_trading_day(day):
+    # Weekends only; exchange holidays are treated as trading days (refreshes just return unchanged bars).
+    return day.weekday() < 5
+
+
+def market_is_open(now):
+    now = now.astimezone(IST)
+    return is_trading_day(now) and MARKET_OPEN <= now.time() <= MARKET_CLOSE
+
+
+def next_market_open(now):
+    now = now.astimezone(IST)
+    day = now.date()
+    while True:
+        candidate = datetime.combine(day, MARKET_OPEN, tzinfo=IST)
+        if candidate > now and is_trading_day(candidate): return candidate
+        day += timedelta(days=1)
+
+
+def seconds_until_market_open(now):
+    return (next_market_open(now) - now.astimezone(IST)).total_seconds()
+
+
+# --- Market-hours Background Scheduler ---
+class MarketHoursScheduler:
+    """Runs market_job every `interval` seconds while NSE is open and eod_job once per trading
+    day after EOD_REFRESH_AT. A process that starts while the market is closed runs eod_job once
+    straight away so its snapshots are warm before the first request.
+
+    The clock is injectable (a callable returning an aware datetime), and run_pending(now) can be
+    driven directly without starting the thread.
+    """
+
+    def __init__(self, market_job, eod_job, interval=PREWARM_INTERVAL_SECONDS, clock=ist_now, eod_at=EOD_REFRESH_AT):
+        self.market_job = market_job
+        self.eod_job = eod_job
+        self.interval = interval
+        self.eod_at = eod_at
+        self._clock = clock
+        self._last_market_run = None
+        self._last_eod_date = None
+        self._warmed = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def due_jobs(self, now):
+        now = now.astimezone(IST)
+        jobs = []
+        if market_is_open(now):
+            if self._last_market_run is None or (now - self._last_market_run).total_seconds() >= self.interval: jobs.append("market")
+        elif not self._warmed or (is_trading_day(now) and now.time() >= self.eod_at and self._last_eod_date != now.date()):
+            jobs.append("eod")
+        return jobs
+
+    def run_pending(self, now=None):
+        now = (now or self._clock()).astimezone(IST)
+        jobs = self.due_jobs(now)
+        for name in jobs:
+            # Timestamps advance even when a job fails, so a broken upstream is retried on the normal cadence.
+            if name == "market": self._last_market_run = now
+            elif is_trading_day(now) and now.time() >= self.eod_at: self._last_eod_date = now.date()
+            # A warm-up before eod_at (overnight, or between the close and eod_at) leaves that day's EOD run due.
+            self._warmed = True
+            try:
+                print(f"\n--- Prewarm: running {name} job at {now:%Y-%m-%d %H:%M:%S %Z} ---")
+                (self.market_job if name == "market" else self.eod_job)()
+            except Exception as e:
+                print(f"  ERROR: Prewarm {name} job failed: {e}")
+                traceback.print_exc()
+        return jobs
+
+    def seconds_until_next(self, now=None):
+        now = (now or self._clock()).astimezone(IST)
+        if market_is_open(now):
+            elapsed = (now - self._last_market_run).total_seconds() if self._last_market_run else self.interval
+            return max(1.0, self.interval - elapsed)
+        candidates = [seconds_until_market_open(now), MAX_IDLE_SECONDS]
+        eod_today = datetime.combine(now.date(), self.eod_at, tzinfo=IST)
+        if is_trading_day(now) and self._last_eod_date != now.date() and eod_today > now:
+            candidates.append((eod_today - now).total_seconds())
+        return max(1.0, min(candidates))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(self.seconds_until_next())
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None: return False
+            self._thread = threading.Thread(target=self._run, name="prewarm-scheduler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
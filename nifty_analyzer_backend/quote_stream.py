@@ -0,0 +1,214 @@
+# quote_stream.py
+
+import os
+import json
+import queue
+import threading
+import traceback
+
+# --- Quote Stream Configuration ---
+STREAM_POLL_SECONDS = float(os.environ.get("STREAM_POLL_SECONDS", "15"))
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", "16"))   # Pending events per subscriber before it is resynced
+STREAM_MAX_RESYNCS = int(os.environ.get("STREAM_MAX_RESYNCS", "3"))  # Overflows without catching up before it is dropped
+STREAM_MAX_SUBSCRIBERS = int(os.environ.get("STREAM_MAX_SUBSCRIBERS", "16")) # Per worker; each open stream holds a gunicorn thread
+STREAM_HEARTBEAT_SECONDS = 15.0
+STREAM_FIELDS = ("cmp", "dayChangePercent", "dayChangeAbs", "volume")
+SIGNAL_FIELDS = ("dmaSignal", "lastSignalDate") # Only sent when the DMA signal flips
+
+
+def quote_delta(previous, row):
+    """Fields of `row` that differ from `previous` (all stream fields for a first sighting)."""
+    changed = {f: row.get(f) for f in STREAM_FIELDS if previous is None or previous.get(f) != row.get(f)}
+    if previous is None or previous.get("dmaSignal") != row.get("dmaSignal"):
+        changed.update({f: row.get(f) for f in SIGNAL_FIELDS})
+    return changed
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# --- Per-client Subscription ---
+class Subscription:
+    """Bounded event queue for one client.
+
+    Deltas carry absolute field values, so nothing is lost by skipping some of them: when the
+    queue overflows it is emptied and the client gets a fresh snapshot instead. A client that keeps
+    overflowing without ever catching up is disconnected (EventSource clients reconnect on their own).
+    """
+
+    def __init__(self, broadcaster, tickers=None, max_queue=STREAM_QUEUE_SIZE):
+        self.broadcaster = broadcaster
+        self.tickers = set(tickers) if tickers else None
+        self.overflows = 0
+        self.close_reason = None
+        self._queue = queue.Queue(max_queue)
+        self._resync = threading.Event()
+        self._lock = threading.Lock()
+
+    def wants(self, ticker_symbol):
+        return self.tickers is None or ticker_symbol in self.tickers
+
+    def _drain(self):
+        while True:
+            try: self._queue.get_nowait()
+            except queue.Empty: return
+
+    def offer(self, event):
+        """Queue an event without blocking; returns False when the queue overflowed."""
+        with self._lock:
+            if self.close_reason is not None: return False
+            try:
+                self._queue.put_nowait(event)
+                return True
+            except queue.Full:
+                self._drain()
+                self.overflows += 1
+                self._resync.set()
+                return False
+
+    def close(self, reason):
+        with self._lock:
+            self.close_reason = reason
+            self._resync.clear() # A closing client gets no further snapshot
+            self._drain()
+            self._queue.put_nowait(None)
+
+    def events(self, heartbeat=STREAM_HEARTBEAT_SECONDS):
+        """Yields (event, data) pairs: one snapshot, then deltas, heartbeats and resync snapshots."""
+        try:
+            yield "snapshot", self.broadcaster.snapshot(self.tickers)
+            while True:
+                if self._resync.is_set():
+                    self._resync.clear()
+                    yield "snapshot", self.broadcaster.snapshot(self.tickers)
+                try: event = self._queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield "heartbeat", None
+                    continue
+                if event is None:
+                    yield "close", {"reason": self.close_reason}
+                    return
+                if self._queue.empty(): self.overflows = 0 # caught up
+                yield event
+        finally:
+            self.broadcaster.unsubscribe(self)
+
+    def sse(self, heartbeat=STREAM_HEARTBEAT_SECONDS):
+        for event, data in self.events(heartbeat):
+            yield ": keepalive\n\n" if event == "heartbeat" else format_sse(event, data)
+
+
+# --- Shared Poll Loop ---
+class QuoteBroadcaster:
+    """One upstream poll loop per process, fanned out to every subscriber as quote deltas.
+
+    poll_fn returns quote rows shaped like the quick-update payload. The loop starts with the
+    first subscriber and stops (forgetting its state) when the last one leaves, so upstream load
+    does not grow with the number of viewers. At most max_subscribers streams are open at once, so
+    streams cannot take every server thread away from regular requests.
+    """
+
+    def __init__(self, poll_fn, interval=STREAM_POLL_SECONDS, max_queue=STREAM_QUEUE_SIZE, max_resyncs=STREAM_MAX_RESYNCS,
+                 max_subscribers=STREAM_MAX_SUBSCRIBERS):
+        self.poll_fn = poll_fn
+        self.interval = interval
+        self.max_queue = max_queue
+        self.max_resyncs = max_resyncs
+        self.max_subscribers = max_subscribers
+        self._state = {}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {"polls": 0, "deltas": 0, "resyncs": 0, "dropped": 0, "rejected": 0}
+
+    def snapshot(self, tickers=None):
+        with self._lock:
+            return [dict(row) for t, row in self._state.items() if tickers is None or t in tickers]
+
+    def subscribe(self, tickers=None):
+        """A new Subscription, or None when max_subscribers streams are already open."""
+        subscription = Subscription(self, tickers, self.max_queue)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self.stats["rejected"] += 1
+                return None
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="quote-stream", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock: self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock: return len(self._subscribers)
+
+    def poll_once(self):
+        rows = self.poll_fn() or []
+        deltas = []
+        with self._lock:
+            self.stats["polls"] += 1
+            for row in rows:
+                if not row or row.get("error") or not row.get("ticker"): continue
+                changed = quote_delta(self._state.get(row["ticker"]), row)
+                self._state[row["ticker"]] = {f: row.get(f) for f in ("ticker", "name") + STREAM_FIELDS + SIGNAL_FIELDS}
+                if changed: deltas.append(dict(changed, ticker=row["ticker"]))
+            self.stats["deltas"] += len(deltas)
+        if deltas: self.publish(deltas)
+        return deltas
+
+    def publish(self, deltas):
+        with self._lock: subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            relevant = [d for d in deltas if subscription.wants(d["ticker"])]
+            if not relevant or subscription.offer(("delta", relevant)): continue
+            self.stats["resyncs"] += 1
+            if subscription.overflows > self.max_resyncs:
+                print(f"  WARN: Dropping slow quote stream subscriber after {subscription.overflows} overflows")
+                self.stats["dropped"] += 1
+                subscription.close("slow consumer")
+                self.unsubscribe(subscription)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers or self._stop.is_set():
+                    self._thread, self._state = None, {}
+                    return
+            try: self.poll_once()
+            except Exception as e:
+                print(f"  ERROR: Quote stream poll failed: {e}")
+                traceback.print_exc()
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+# --- Offline Harness: one fast and one stalled subscriber on a fake feed ---
+if __name__ == '__main__':
+    import time
+    from data_sources import FakeQuoteSource
+    from screener import load_universe, DEFAULT_UNIVERSE
+    NIFTY50_TICKERS = load_universe(DEFAULT_UNIVERSE)
+
+    feed = FakeQuoteSource(NIFTY50_TICKERS, move_fraction=0.5, flip_probability=0.05)
+    broadcaster = QuoteBroadcaster(feed.quotes, interval=0.05, max_queue=4, max_resyncs=2)
+    received = {"fast": 0, "stalled": 0}
+
+    def consume(name, subscription, pause):
+        for event, data in subscription.events(heartbeat=0.5):
+            received[name] += 1
+            if event == "close": print(f"{name}: closed ({data['reason']})"); return
+            time.sleep(pause)
+
+    viewers = [threading.Thread(target=consume, args=("fast", broadcaster.subscribe(), 0), daemon=True),
+               threading.Thread(target=consume, args=("stalled", broadcaster.subscribe(["TCS.NS", "INFY.NS"]), 1.0), daemon=True)]
+    for viewer in viewers: viewer.start()
+    time.sleep(3)
+    broadcaster.stop()
+    print(f"upstream polls={feed.polls}  events received={received}  stats={broadcaster.stats}")
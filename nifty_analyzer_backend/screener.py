@@ -0,0 +1,220 @@
+# screener.py
+
+import os
+import re
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from dma_signals import SIGNAL_LABELS, SIG_NA_DATA, compact_columns, compute_dma_signals
+
+# --- Universe Files ---
+UNIVERSE_DIR = os.environ.get("UNIVERSE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "universes"))
+DEFAULT_UNIVERSE = "nifty50"
+_UNIVERSE_NAME = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def universe_path(name, universe_dir=UNIVERSE_DIR):
+    if not _UNIVERSE_NAME.match(name or ""): raise ValueError(f"Invalid universe name: {name!r}")
+    return os.path.join(universe_dir, name + ".txt")
+
+
+def load_universe(name, universe_dir=UNIVERSE_DIR):
+    """Symbols listed in <universe_dir>/<name>.txt: one per line, '#' starts a comment, duplicates dropped."""
+    path = universe_path(name, universe_dir)
+    if not os.path.exists(path): raise KeyError(f"Unknown universe: {name}")
+    tickers = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            symbol = line.split("#", 1)[0].strip().upper()
+            if symbol and symbol not in tickers: tickers.append(symbol)
+    return tickers
+
+
+def list_universes(universe_dir=UNIVERSE_DIR):
+    if not os.path.isdir(universe_dir): return []
+    return sorted(name[:-4] for name in os.listdir(universe_dir) if name.endswith(".txt") and _UNIVERSE_NAME.match(name[:-4]))
+
+
+# --- Index Columns ---
+FUNDAMENTAL_FIELDS = ("marketCap", "trailingPE", "priceToBook", "dividendYield", "beta")
+SCREENER_FIELDS = ("cmp", "dayChangePercent", "dayChangeAbs", "volume", "averageVolume", "volumeRatio",
+                   "fiftyTwoWeekHigh", "fiftyTwoWeekLow", "distanceFromHigh", "smaShort", "smaLong", "maSpread") + FUNDAMENTAL_FIELDS
+INTEGER_FIELDS = ("volume", "averageVolume", "marketCap")
+RATIO_FIELDS = ("volumeRatio", "distanceFromHigh", "maSpread") # Rounded to 4 places, prices to 2
+AVERAGE_VOLUME_BARS = 63 # ~3 months, as Yahoo's averageVolume
+FIFTY_TWO_WEEK_DAYS = 365
+
+
+def _field_matrix(frame, field, tickers):
+    if frame.empty: return np.full((0, len(tickers)), np.nan)
+    return frame.xs(field, axis=1, level=1).reindex(columns=tickers).to_numpy(dtype="f8")
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+
+def _column_max(values, fill):
+    # nanmax/nanmin without the all-NaN warning; columns with no values come back NaN.
+    if values.shape[0] == 0: return np.full(values.shape[1], np.nan)
+    filled = np.where(np.isnan(values), fill, values)
+    result = filled.max(axis=0) if fill < 0 else filled.min(axis=0)
+    return np.where(np.isinf(result), np.nan, result)
+
+
+# --- Query Parsing ---
+_COMPARISONS = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal, "==": np.equal, "!=": np.not_equal}
+_CLAUSE = re.compile(r"^\s*([A-Za-z]+)\s*(<=|>=|==|!=|<|>)\s*(?:(-?\d+(?:\.\d+)?)\s*\*\s*)?([A-Za-z]+|-?\d+(?:\.\d+)?)\s*$")
+
+
+def parse_where(text):
+    """'volume>2*averageVolume;cmp>=0.95*fiftyTwoWeekHigh' -> [(field, op, factor, operand)], operand a field name or float."""
+    clauses = []
+    for part in filter(str.strip, (text or "").split(";")):
+        match = _CLAUSE.match(part)
+        if not match: raise ValueError(f"Could not parse filter: {part.strip()!r}")
+        field, op, factor, operand = match.groups()
+        for name in (field, operand):
+            if name[0].isalpha() and name not in SCREENER_FIELDS: raise ValueError(f"Unknown field: {name}")
+        clauses.append((field, op, float(factor) if factor else 1.0, operand if operand[0].isalpha() else float(operand)))
+    return clauses
+
+
+def parse_signals(text):
+    """Comma-separated signal labels, full ('BUY (Uptrend)') or short ('BUY', 'NEUTRAL', 'N/A') -> signal codes."""
+    labels = {}
+    for code, label in enumerate(SIGNAL_LABELS):
+        for alias in {label.upper(), label.split(" (")[0].split(" / ")[0].upper()}: labels.setdefault(alias, []).append(code)
+    codes = []
+    for label in filter(str.strip, (text or "").split(",")):
+        if label.strip().upper() not in labels: raise ValueError(f"Unknown signal: {label.strip()}")
+        codes.extend(labels[label.strip().upper()])
+    return codes
+
+
+# --- Columnar Screener Index ---
+class ScreenerIndex:
+    """Latest quote, DMA and fundamental values of every symbol in a universe as parallel NumPy columns.
+
+    Built once from the universe's history frame (no per-symbol requests); each query is a
+    vectorized mask plus an argsort over the columns.
+    """
+
+    def __init__(self, tickers, names, columns, signal, signal_dates, built_at=None):
+        self.tickers = np.asarray(tickers, dtype=object)
+        self.names = np.asarray(names, dtype=object)
+        self.columns = columns
+        self.signal = np.asarray(signal)
+        self.signal_dates = np.asarray(signal_dates, dtype=object)
+        self.built_at = built_at if built_at is not None else time.time()
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @classmethod
+    def from_frame(cls, frame, tickers, signal_start=None, names=None, fundamentals=None, today=None):
+        """frame: wide OHLCV frame with (ticker, field) columns, today's provisional bar included."""
+        tickers = list(tickers)
+        today = pd.Timestamp(today or date.today()).normalize()
+        close = _field_matrix(frame, "Close", tickers)
+        compact, order = compact_columns(close)
+        aligned = (lambda m: np.take_along_axis(m, order, axis=0)) if order is not None else (lambda m: m)
+        volume = aligned(_field_matrix(frame, "Volume", tickers))
+        n_rows = compact.shape[0]
+
+        # Quote from each symbol's last two bars.
+        cmp = compact[-1] if n_rows else np.full(len(tickers), np.nan)
+        prev_close = compact[-2] if n_rows > 1 else np.full(len(tickers), np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            day_change_abs = np.where(prev_close != 0, cmp - prev_close, np.nan)
+            day_change_percent = day_change_abs / prev_close * 100
+        last_volume = volume[-1] if n_rows else np.full(len(tickers), np.nan)
+        recent_volume = volume[-AVERAGE_VOLUME_BARS:]
+        counts = (~np.isnan(recent_volume)).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            average_volume = np.where(counts > 0, np.nansum(recent_volume, axis=0) / np.maximum(counts, 1), np.nan)
+
+        # 52-week range from daily highs/lows.
+        year = frame[frame.index >= today - pd.Timedelta(days=FIFTY_TWO_WEEK_DAYS)] if not frame.empty else frame
+        high_52w = _column_max(_field_matrix(year, "High", tickers), -np.inf)
+        low_52w = _column_max(_field_matrix(year, "Low", tickers), np.inf)
+
+        # DMA signals over the same closed-bar window the overview uses.
+        window = frame[frame.index >= signal_start] if signal_start is not None and not frame.empty else frame
+        closed = window[window.index < today] if not window.empty else window
+        signals = compute_dma_signals(_field_matrix(closed, "Close", tickers), closed.index.values, today=today.date())
+        na_data = signals["signal"] == SIG_NA_DATA
+        signal_dates = [pd.Timestamp(closed.index.values[i]).strftime('%Y-%m-%d') if i >= 0 else None for i in signals["signalIndex"]]
+
+        fundamentals = fundamentals or {}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            columns = {
+                "cmp": cmp, "dayChangePercent": day_change_percent, "dayChangeAbs": day_change_abs,
+                "volume": last_volume, "averageVolume": average_volume, "volumeRatio": last_volume / average_volume,
+                "fiftyTwoWeekHigh": high_52w, "fiftyTwoWeekLow": low_52w, "distanceFromHigh": cmp / high_52w - 1,
+                "smaShort": np.where(na_data, np.nan, signals["smaShortLatest"]), "smaLong": np.where(na_data, np.nan, signals["smaLongLatest"]),
+                "maSpread": np.where(na_data, np.nan, signals["maSpread"]),
+            }
+        for field in FUNDAMENTAL_FIELDS:
+            columns[field] = np.array([_number((fundamentals.get(t) or {}).get(field)) for t in tickers], dtype="f8")
+        names = names or {}
+        return cls(tickers, [names.get(t, t.replace(".NS", "")) for t in tickers], columns, signals["signal"], signal_dates)
+
+    def fundamentals_missing(self):
+        """Symbols without any fundamental value; filters on fundamentals can never match them."""
+        if not len(self.tickers): return 0
+        return int(np.isnan(np.column_stack([self.columns[field] for field in FUNDAMENTAL_FIELDS])).all(axis=1).sum())
+
+    def mask(self, where=(), signals=None):
+        selected = np.ones(len(self.tickers), dtype=bool)
+        if signals: selected &= np.isin(self.signal, signals)
+        with np.errstate(invalid="ignore"):
+            for field, op, factor, operand in where:
+                rhs = self.columns[operand] if isinstance(operand, str) else operand
+                selected &= _COMPARISONS[op](self.columns[field], factor * rhs) # NaN never matches
+        return selected
+
+    def query(self, where=(), signals=None, sort=None, limit=None):
+        """(rows, matched count). sort is a field name, '-' prefix for descending; missing values sort last."""
+        matched = np.flatnonzero(self.mask(where, signals))
+        if sort:
+            field = sort.lstrip("-")
+            if field not in self.columns: raise ValueError(f"Unknown sort field: {field}")
+            keys = self.columns[field][matched]
+            keys = np.where(np.isnan(keys), np.inf, -keys if sort.startswith("-") else keys)
+            matched = matched[np.argsort(keys, kind="stable")]
+        total = len(matched)
+        if limit is not None: matched = matched[:limit]
+        return self.rows(matched), total
+
+    def rows(self, indices):
+        # Built column by column (vectorized rounding and NaN masking), then zipped into row dicts.
+        columns = {"ticker": self.tickers[indices].tolist(), "name": self.names[indices].tolist(),
+                   "dmaSignal": [SIGNAL_LABELS[code] for code in self.signal[indices]], "lastSignalDate": self.signal_dates[indices].tolist()}
+        for field in SCREENER_FIELDS:
+            values = self.columns[field][indices]
+            missing = np.isnan(values)
+            if field in INTEGER_FIELDS: column = np.where(missing, 0, values).astype("i8").astype(object)
+            else: column = np.round(values, 4 if field in RATIO_FIELDS else 2).astype(object)
+            column[missing] = None
+            columns[field] = column.tolist()
+        fields = list(columns)
+        return [dict(zip(fields, values)) for values in zip(*(columns[f] for f in fields))]
+
+
+# --- Query Benchmark ---
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    n = 5000
+    columns = {field: rng.uniform(0, 1000, n) for field in SCREENER_FIELDS}
+    index = ScreenerIndex([f"SYM{i}.NS" for i in range(n)], [f"SYM{i}" for i in range(n)], columns, rng.integers(0, len(SIGNAL_LABELS), n), [None] * n)
+    where, signals = parse_where("volume>2*averageVolume;cmp>=0.95*fiftyTwoWeekHigh"), parse_signals("STRONG BUY")
+    start = time.perf_counter()
+    for _ in range(1000): index.mask(where, signals)
+    print(f"{n} symbols: mask {(time.perf_counter() - start):.3f} ms/query", end="")
+    start = time.perf_counter()
+    for _ in range(100): index.query(where, signals, sort="-volumeRatio", limit=50)
+    print(f", query+sort+50 rows {(time.perf_counter() - start) * 10:.3f} ms/query")
@@ -0,0 +1,48 @@
+# single_flight.py
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+# --- In-flight Request Coalescing ---
+class SingleFlight:
+    """Runs one computation per key at a time; concurrent callers with the same key wait for it
+    and all receive its result (or its exception)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"executed": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["executed"] += 1
+            else:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock: del self._calls[key]
+                call.done.set()
+        if call.error is not None: raise call.error
+        return call.result
+
+    def in_flight(self):
+        with self._lock: return len(self._calls)
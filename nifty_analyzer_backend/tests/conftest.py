@@ -0,0 +1,18 @@
+# conftest.py
+
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other by top-level name (as gunicorn runs them from this directory).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app_module(monkeypatch, tmp_path):
+    # app reads its configuration at import: no prewarm thread, a throwaway store, no shared cache.
+    for name, value in {"PREWARM_ENABLED": "0", "OHLCV_DATA_DIR": str(tmp_path), "CACHE_SHARED_PATH": "", "FETCH_RATE_PER_SECOND": "0"}.items():
+        monkeypatch.setenv(name, value)
+    import app
+    return app
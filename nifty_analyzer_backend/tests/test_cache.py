@@ -0,0 +1,68 @@
+# test_cache.py
+
+import pytest
+
+from cache import LRUCache, SQLiteCache, TieredCache
+
+
+@pytest.fixture
+def clock():
+    now = [1_000_000.0]
+    clock = lambda: now[0]
+    clock.now = now
+    return clock
+
+
+@pytest.fixture
+def shared(tmp_path, clock):
+    return SQLiteCache(str(tmp_path / "cache.sqlite3"), clock=clock, max_rows=0, purge_every=0)
+
+
+def test_lru_evicts_the_least_recently_used_entry(clock):
+    cache = LRUCache(max_entries=2, clock=clock)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    assert cache.get("a") == 1 # "b" is now the least recently used
+    cache.set("c", 3, 60)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats == {"hits": 3, "misses": 1, "evictions": 1, "expirations": 0}
+
+
+def test_each_data_class_expires_after_its_own_ttl(clock):
+    cache = TieredCache(LRUCache(clock=clock), ttls={"quote": 15, "info": 600})
+    cache.set("quote", "TCS.NS", {"cmp": 1})
+    cache.set("info", "TCS.NS", {"name": "TCS"})
+    clock.now[0] += 14
+    assert cache.get("quote", "TCS.NS") == {"cmp": 1}
+    clock.now[0] += 1
+    assert cache.get("quote", "TCS.NS") is None and cache.get("info", "TCS.NS") == {"name": "TCS"}
+    assert cache.expires_in("info", "TCS.NS") == 585
+    assert cache.memory.stats["expirations"] == 1
+    stats = cache.stats()["memory"]
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["hitRatio"]) == (2, 1, 1, round(2 / 3, 4))
+
+
+def test_shared_hit_is_promoted_with_the_shared_expiry(clock, shared):
+    writer = TieredCache(LRUCache(clock=clock), shared) # another worker
+    writer.set("quote", "TCS.NS", {"cmp": 1}, ttl=30)
+    clock.now[0] += 20
+    reader = TieredCache(LRUCache(clock=clock), shared)
+    assert reader.get("quote", "TCS.NS") == {"cmp": 1}
+    assert reader.memory.expires_in("quote:TCS.NS") == 10 # not a fresh 15 s quote TTL
+    assert reader.get("quote", "TCS.NS") == {"cmp": 1}
+    assert (reader.memory.stats["hits"], shared.stats["hits"]) == (1, 1)
+    clock.now[0] += 10
+    assert reader.get("quote", "TCS.NS") is None
+    assert shared.stats["expirations"] == 1
+
+
+def test_shared_writes_purge_expired_rows_then_cap_the_row_count(tmp_path, clock):
+    shared = SQLiteCache(str(tmp_path / "cache.sqlite3"), clock=clock, max_rows=3, purge_every=4)
+    for day in range(3): shared.set(f"history:TCS.NS@2026-10-1{day}/columns", [day], 60) # never read again
+    clock.now[0] += 60
+    shared.set("quote:A", 1, 10)
+    assert shared.stats["purges"] == 1 and shared.stats["expirations"] == 3
+    for key, ttl in [("quote:B", 30), ("quote:C", 20), ("quote:D", 40), ("quote:E", 50)]: shared.set(key, 1, ttl)
+    assert shared.stats["purges"] == 2 and shared.stats["evictions"] == 2
+    rows = shared._connection().execute("SELECT key FROM cache ORDER BY key").fetchall()
+    assert [key for key, in rows] == ["quote:B", "quote:D", "quote:E"] # the soonest-expiring rows went first
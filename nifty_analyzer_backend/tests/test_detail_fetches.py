@@ -0,0 +1,61 @@
+# test_detail_fetches.py
+
+from collections import Counter
+
+import pytest
+
+from data_sources import FakeDataSource
+
+
+class CountingSource(FakeDataSource):
+    """FakeDataSource that counts upstream calls per (method, ticker[, statement])."""
+
+    def __init__(self, **params):
+        super().__init__(latency=0, **params)
+        self.calls = Counter()
+
+    def history(self, ticker_symbol, start, end, interval="1d"):
+        self.calls["history", ticker_symbol] += 1
+        return super().history(ticker_symbol, start, end, interval)
+
+    def info(self, ticker_symbol):
+        self.calls["info", ticker_symbol] += 1
+        return super().info(ticker_symbol)
+
+    def statement(self, ticker_symbol, name):
+        self.calls["statement", ticker_symbol, name] += 1
+        return super().statement(ticker_symbol, name)
+
+    def download(self, tickers, start, end, interval="1d"):
+        self.calls["download", len(tickers)] += 1
+        return super().download(tickers, start, end, interval)
+
+
+@pytest.fixture
+def source(app_module, monkeypatch):
+    source = CountingSource()
+    monkeypatch.setattr(app_module, "data_source", source)
+    monkeypatch.setattr(app_module.history_loader, "source", source)
+    app_module.history_loader.frame() # universe bulk load, not part of the counted requests
+    source.calls.clear()
+    return source
+
+
+@pytest.mark.parametrize("ticker_symbol", ["IRCTC.NS", "TCS.NS"]) # outside and inside the universe
+def test_full_detail_fetches_each_upstream_object_once(app_module, source, ticker_symbol):
+    response = app_module.app.test_client().get(f"/api/stock_detail/{ticker_symbol}?refresh=all")
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload["historicalData"] and payload["currentDma"]["signal"]
+    repeated = {call: count for call, count in source.calls.items() if count > 1}
+    assert not repeated
+    single_history = source.calls["history", ticker_symbol]
+    assert single_history == (0 if ticker_symbol in app_module.NIFTY50_TICKERS else 1)
+
+
+def test_quote_and_chart_read_the_same_history(app_module, source):
+    payload = app_module.app.test_client().get("/api/stock_detail/IRCTC.NS?sections=history,signals&refresh=true&format=columnar").get_json()
+    assert source.calls["history", "IRCTC.NS"] == 1
+    assert payload["historicalData"]["time"] and payload["currentDma"]["smaShortValue"] is not None
+    # The slice of the chart-window history gives the same quote and signal as a signal-window fetch.
+    assert app_module.get_stock_data_and_signal("IRCTC.NS") == app_module.get_stock_data_and_signal("IRCTC.NS", hist_df=app_module.get_detail_history("IRCTC.NS"))
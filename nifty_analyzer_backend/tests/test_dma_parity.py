@@ -0,0 +1,147 @@
+# test_dma_parity.py
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dma_signals import (SHORT_WINDOW, LONG_WINDOW, RECENT_CROSSOVER_DAYS, MA_SPREAD_STRONG_THRESHOLD, MA_SPREAD_NEUTRAL_THRESHOLD,
+                         SIGNAL_LABELS, compute_dma_signals, IncrementalDMA)
+
+TRADING_DAYS = pd.bdate_range("2024-01-01", periods=320)
+
+
+# --- Reference: the original per-ticker classification (one pandas history per ticker) ---
+def reference_signal(closes, today):
+    """(signal label, signal date or None, latest SMA short, latest SMA long) of one ticker's bars."""
+    hist_df = pd.DataFrame({"Close": closes})
+    if hist_df.empty or len(hist_df) < LONG_WINDOW: return "N/A (Data)", None, None, None
+    sma_short_col, sma_long_col = f'SMA_{SHORT_WINDOW}', f'SMA_{LONG_WINDOW}'
+    hist_df[sma_short_col] = hist_df['Close'].rolling(window=SHORT_WINDOW, min_periods=1).mean()
+    hist_df[sma_long_col] = hist_df['Close'].rolling(window=LONG_WINDOW, min_periods=1).mean()
+    valid_ma_hist = hist_df.dropna(subset=[sma_short_col, sma_long_col])
+    current_signal, date_of_signal = "N/A (Logic)", None
+    hist_with_signals = valid_ma_hist.copy()
+    hist_with_signals['BuyCrossover'] = (hist_with_signals[sma_short_col] > hist_with_signals[sma_long_col]) & (hist_with_signals[sma_short_col].shift(1) <= hist_with_signals[sma_long_col].shift(1))
+    hist_with_signals['SellCrossover'] = (hist_with_signals[sma_short_col] < hist_with_signals[sma_long_col]) & (hist_with_signals[sma_short_col].shift(1) >= hist_with_signals[sma_long_col].shift(1))
+    last_buy_event_date = hist_with_signals[hist_with_signals['BuyCrossover']].index.max() if hist_with_signals['BuyCrossover'].any() else pd.NaT
+    last_sell_event_date = hist_with_signals[hist_with_signals['SellCrossover']].index.max() if hist_with_signals['SellCrossover'].any() else pd.NaT
+    sma_short_latest, sma_long_latest = valid_ma_hist.iloc[-1][sma_short_col], valid_ma_hist.iloc[-1][sma_long_col]
+    days_since_last_buy = (today - last_buy_event_date.date()).days if pd.notna(last_buy_event_date) else float('inf')
+    days_since_last_sell = (today - last_sell_event_date.date()).days if pd.notna(last_sell_event_date) else float('inf')
+    ma_spread = (sma_short_latest - sma_long_latest) / sma_long_latest if sma_long_latest != 0 and pd.notna(sma_long_latest) else 0
+    events = [d for d in (last_buy_event_date, last_sell_event_date) if pd.notna(d)]
+    latest_event = max(events) if events else None # A neutral signal dates from the latest crossover of either kind
+
+    if sma_short_latest > sma_long_latest:
+        date_of_signal = last_buy_event_date if pd.notna(last_buy_event_date) else None
+        if pd.notna(last_buy_event_date) and (pd.isna(last_sell_event_date) or last_buy_event_date > last_sell_event_date):
+            if days_since_last_buy <= RECENT_CROSSOVER_DAYS and ma_spread >= MA_SPREAD_STRONG_THRESHOLD: current_signal = "STRONG BUY"
+            elif days_since_last_buy <= RECENT_CROSSOVER_DAYS: current_signal = "RECENT BUY"
+            else: current_signal = "BUY (Uptrend)"
+        else: current_signal, date_of_signal = "POTENTIAL BUY / RECOVERY", None
+    elif sma_short_latest < sma_long_latest:
+        date_of_signal = last_sell_event_date if pd.notna(last_sell_event_date) else None
+        if pd.notna(last_sell_event_date) and (pd.isna(last_buy_event_date) or last_sell_event_date > last_buy_event_date):
+            if days_since_last_sell <= RECENT_CROSSOVER_DAYS and abs(ma_spread) >= MA_SPREAD_STRONG_THRESHOLD: current_signal = "STRONG SELL"
+            elif days_since_last_sell <= RECENT_CROSSOVER_DAYS: current_signal = "RECENT SELL"
+            else: current_signal = "SELL (Downtrend)"
+        else: current_signal, date_of_signal = "POTENTIAL SELL / DECLINE", None
+    else: current_signal, date_of_signal = "NEUTRAL / SIDEWAYS", latest_event
+    if abs(ma_spread) < MA_SPREAD_NEUTRAL_THRESHOLD and not (current_signal in ["STRONG BUY", "STRONG SELL"] and (days_since_last_buy <= RECENT_CROSSOVER_DAYS or days_since_last_sell <= RECENT_CROSSOVER_DAYS)):
+        current_signal, date_of_signal = "NEUTRAL / SIDEWAYS", latest_event
+    return current_signal, (date_of_signal.date() if date_of_signal is not None else None), sma_short_latest, sma_long_latest
+
+
+# --- Seeded synthetic universe: one column per case, NaN where the ticker has no bar ---
+def random_walk(rng, n, drift=0.0, vol=0.02):
+    # Rounded to the NSE tick of 0.05, as upstream prices are.
+    return np.round(100 * np.exp(np.cumsum(rng.normal(drift, vol, n))) / 0.05) * 0.05
+
+def synthetic_universe(seed=7):
+    rng = np.random.default_rng(seed)
+    n = len(TRADING_DAYS)
+    columns = {
+        "flat": np.full(n, 250.0),
+        "flat_then_step": np.r_[np.full(n - 8, 100.0), np.full(8, 104.0)], # fresh strong buy
+        "ties_period_10": np.tile([100.0, 102, 101, 99, 98, 100, 103, 101, 97, 99], n // 10), # SMAs tie exactly every bar
+        "ties_then_drop": np.r_[np.tile([50.0, 52, 48, 50, 51, 49, 50, 50, 52, 48], n // 10 - 1), np.linspace(49, 40, 10)],
+        "v_bottom": np.r_[np.linspace(100, 90, n - 8), 90 + np.arange(1, 9)], # recent, thin-spread buy
+        "uptrend": random_walk(rng, n, drift=0.004),
+        "downtrend": random_walk(rng, n, drift=-0.004),
+        "short_history": np.r_[np.full(n - LONG_WINDOW + 1, np.nan), random_walk(rng, LONG_WINDOW - 1)], # one bar short
+        "exact_long_window": np.r_[np.full(n - LONG_WINDOW, np.nan), random_walk(rng, LONG_WINDOW)],
+        "single_bar": np.r_[np.full(n - 1, np.nan), [120.0]],
+        "no_bars": np.full(n, np.nan),
+    }
+    for i in range(12):
+        columns[f"walk_{i}"] = random_walk(rng, n, vol=0.01 + 0.005 * i)
+    for i in range(6): # late listings
+        close = random_walk(rng, n)
+        close[:rng.integers(LONG_WINDOW - 10, 250)] = np.nan
+        columns[f"late_listing_{i}"] = close
+    for i in range(6): # gaps: suspended or missing days inside the history
+        close = random_walk(rng, n)
+        close[rng.choice(n - 1, size=rng.integers(5, 60), replace=False)] = np.nan
+        columns[f"gaps_{i}"] = close
+    columns["gap_on_last_bar"] = np.r_[random_walk(rng, n - 1), [np.nan]]
+    return pd.DataFrame(columns, index=TRADING_DAYS)
+
+UNIVERSE = synthetic_universe()
+TODAY_OFFSETS = (0, 3, RECENT_CROSSOVER_DAYS + 1, 40) # Days between the last bar and "today"
+
+
+def assert_matches_reference(ticker, closes, today, signal, signal_date, sma_short, sma_long):
+    expected_signal, expected_date, expected_short, expected_long = reference_signal(closes, today)
+    assert SIGNAL_LABELS[signal] == expected_signal, ticker
+    assert signal_date == expected_date, ticker
+    if expected_short is not None and expected_signal != "N/A (Data)":
+        assert sma_short == pytest.approx(expected_short, rel=1e-9), ticker
+        assert sma_long == pytest.approx(expected_long, rel=1e-9), ticker
+
+
+@pytest.mark.parametrize("offset", TODAY_OFFSETS)
+def test_vectorized_signals_match_per_ticker_reference(offset):
+    today = TRADING_DAYS[-1].date() + timedelta(days=offset)
+    result = compute_dma_signals(UNIVERSE.to_numpy(), UNIVERSE.index.values, today=today)
+    dates = UNIVERSE.index.date
+    for col, ticker in enumerate(UNIVERSE.columns):
+        row = result["signalIndex"][col]
+        assert_matches_reference(ticker, UNIVERSE[ticker].dropna(), today, result["signal"][col], dates[row] if row >= 0 else None,
+                                 result["smaShortLatest"][col], result["smaLongLatest"][col])
+
+
+@pytest.mark.parametrize("offset", TODAY_OFFSETS)
+def test_incremental_signals_match_per_ticker_reference(offset):
+    today = TRADING_DAYS[-1].date() + timedelta(days=offset)
+    for ticker in UNIVERSE.columns:
+        closes = UNIVERSE[ticker].dropna()
+        state = IncrementalDMA.from_history(closes.index.values, closes.to_numpy())
+        assert_matches_reference(ticker, closes, today, *state.signal(today=today))
+
+
+@pytest.mark.parametrize("offset", TODAY_OFFSETS)
+def test_provisional_bar_matches_reference_with_that_bar_closed(offset):
+    # Today's moving price over the closed bars gives the signal the bar will have once it closes.
+    today = TRADING_DAYS[-1].date() + timedelta(days=offset)
+    for ticker in UNIVERSE.columns:
+        closes = UNIVERSE[ticker].dropna()
+        if closes.empty: continue
+        state = IncrementalDMA.from_history(closes.index.values[:-1], closes.to_numpy()[:-1])
+        state.update_provisional(closes.index.values[-1], closes.iloc[-1])
+        assert_matches_reference(ticker, closes, today, *state.signal(today=today))
+        assert state.signal(today=today, include_provisional=False)[0] == IncrementalDMA.from_history(closes.index.values[:-1], closes.to_numpy()[:-1]).signal(today=today)[0]
+
+
+def test_incremental_matches_vectorized_bar_by_bar():
+    # Every prefix of a gappy, late-listed column: the O(1) state tracks a full recompute after each bar.
+    closes = UNIVERSE["gaps_0"].dropna()
+    state = IncrementalDMA()
+    for i, (bar_date, close) in enumerate(closes.items()):
+        state.add_bar(bar_date, close)
+        expected = compute_dma_signals(closes.to_numpy()[:i + 1], closes.index.values[:i + 1], today=bar_date.date())
+        signal, signal_date, _, _ = state.signal(today=bar_date.date())
+        assert signal == expected["signal"][0]
+        row = expected["signalIndex"][0]
+        assert signal_date == (closes.index[row].date() if row >= 0 else None)
@@ -0,0 +1,54 @@
+# test_history_loader.py
+
+import threading
+
+from data_sources import FakeDataSource
+from history_loader import HistoryLoader
+
+TICKERS = ["TCS.NS", "INFY.NS", "ITC.NS"]
+
+
+class GatedDownloadSource(FakeDataSource):
+    """FakeDataSource whose downloads block once the test closes the gate."""
+
+    def __init__(self, **params):
+        super().__init__(latency=0, **params)
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+        self.downloads = 0
+
+    def download(self, tickers, start, end, interval="1d"):
+        self.downloads += 1
+        self.entered.set()
+        assert self.gate.wait(timeout=10)
+        return super().download(tickers, start, end, interval)
+
+
+def run(fn, *args, **kwargs):
+    thread = threading.Thread(target=fn, args=args, kwargs=kwargs, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_readers_are_not_blocked_by_the_quote_tail_download():
+    source = GatedDownloadSource()
+    loader = HistoryLoader(TICKERS, source)
+    frame = loader.frame()
+    loader._tail_loaded_at -= 60 # the bulk load counts as a fresh tail; age it past both refresh gaps
+    source.gate.clear()
+    source.entered.clear()
+    refreshes = [run(loader.refresh_quotes, force_refresh=True) for _ in range(3)]
+    assert source.entered.wait(timeout=5)
+
+    read = []
+    reader = run(lambda: read.append(loader.ticker_history("TCS.NS")))
+    reader.join(timeout=2)
+    assert not reader.is_alive() and not read[0].empty # served from the previous frame mid-download
+    assert loader.frame() is frame
+
+    source.gate.set()
+    for thread in refreshes: thread.join(timeout=5)
+    assert source.downloads == 2 # the initial load plus one shared tail download
+    assert loader.frame() is not frame
+    assert loader.refresh_quotes(force_refresh=True) is loader.frame() and source.downloads == 2 # tail still fresh
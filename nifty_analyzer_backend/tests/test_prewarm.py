@@ -0,0 +1,121 @@
+# test_prewarm.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from cache import TieredCache, LRUCache
+from prewarm import MarketHoursScheduler, IST, MAX_IDLE_SECONDS
+
+INTERVAL = 15
+
+
+def at(day, hour, minute=0, second=0):
+    # October 2026: the 12th is a Monday, the 17th and 18th are a weekend.
+    return datetime(2026, 10, day, hour, minute, second, tzinfo=IST)
+
+
+@pytest.fixture
+def scheduler():
+    runs = []
+    scheduler = MarketHoursScheduler(lambda: runs.append("market"), lambda: runs.append("eod"), interval=INTERVAL, clock=lambda: None)
+    scheduler.runs = runs
+    return scheduler
+
+
+def test_market_job_runs_every_interval_while_open(scheduler):
+    assert scheduler.run_pending(at(13, 9, 15)) == ["market"] # open is inclusive
+    assert scheduler.run_pending(at(13, 9, 15, 10)) == []
+    assert scheduler.seconds_until_next(at(13, 9, 15, 10)) == 5
+    assert scheduler.run_pending(at(13, 9, 15, 15)) == ["market"]
+    assert scheduler.run_pending(at(13, 15, 30)) == ["market"] # close is inclusive
+    assert scheduler.runs == ["market"] * 3
+
+
+def test_warm_up_before_open_then_sleep_until_open(scheduler):
+    assert scheduler.run_pending(at(13, 9, 0)) == ["eod"]
+    assert scheduler.run_pending(at(13, 9, 10)) == []
+    assert scheduler.seconds_until_next(at(13, 9, 10)) == 5 * 60
+    assert scheduler.run_pending(at(13, 9, 15)) == ["market"]
+
+
+def test_after_close_waits_for_the_eod_run_once_per_day(scheduler):
+    scheduler.run_pending(at(13, 15, 30))
+    assert scheduler.run_pending(at(13, 15, 31)) == [] # already warm from the market ticks
+    assert scheduler.seconds_until_next(at(13, 15, 31)) == 29 * 60
+    assert scheduler.run_pending(at(13, 16, 0)) == ["eod"]
+    assert scheduler.run_pending(at(13, 16, 30)) == []
+    assert scheduler.run_pending(at(13, 23, 0)) == []
+    assert scheduler.seconds_until_next(at(13, 23, 0)) == MAX_IDLE_SECONDS
+
+
+@pytest.mark.parametrize("start", [(2, 0), (15, 45)]) # overnight, and between the close and the EOD time
+def test_warm_up_before_eod_time_leaves_the_days_eod_run_due(scheduler, start):
+    assert scheduler.run_pending(at(13, *start)) == ["eod"]
+    assert scheduler.run_pending(at(13, 16, 5)) == ["eod"]
+    assert scheduler.run_pending(at(13, 16, 30)) == []
+
+
+def test_warm_up_after_eod_time_counts_as_the_days_eod_run(scheduler):
+    assert scheduler.run_pending(at(13, 17, 0)) == ["eod"]
+    assert scheduler.run_pending(at(13, 18, 0)) == []
+    assert scheduler.run_pending(at(14, 16, 0)) == ["eod"] # next trading day
+
+
+def test_weekends_only_warm_up(scheduler):
+    assert scheduler.run_pending(at(17, 10, 0)) == ["eod"] # Saturday start: warm-up only
+    assert scheduler.run_pending(at(17, 16, 30)) == []
+    assert scheduler.run_pending(at(18, 11, 0)) == []
+    assert scheduler.seconds_until_next(at(18, 23, 30)) == MAX_IDLE_SECONDS
+    assert scheduler.seconds_until_next(at(19, 8, 30)) == 45 * 60 # Monday's open
+    assert scheduler.run_pending(at(19, 9, 15)) == ["market"]
+
+
+def test_failing_job_still_advances_the_schedule():
+    calls = []
+    def failing_job():
+        calls.append(1)
+        raise RuntimeError("upstream down")
+    scheduler = MarketHoursScheduler(failing_job, lambda: None, interval=INTERVAL)
+    assert scheduler.run_pending(at(13, 10, 0)) == ["market"]
+    assert scheduler.run_pending(at(13, 10, 0, 5)) == []
+    assert len(calls) == 1
+
+
+# --- Snapshot rebuilds per market tick ---
+@pytest.fixture
+def ticking_app(app_module, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(app_module, "data_cache", TieredCache(LRUCache(clock=lambda: now[0])))
+    builds = []
+    def build_overview():
+        now[0] += 2.0 # builds take time, so the snapshot is written after the tick started
+        builds.append(now[0])
+        return [], 200
+    monkeypatch.setattr(app_module, "build_stock_overview", build_overview)
+    monkeypatch.setattr(app_module, "build_stock_quick_updates", lambda: ([], 200))
+    monkeypatch.setattr(app_module.history_loader, "refresh_quotes", lambda force_refresh=False: None)
+    monkeypatch.setattr(app_module, "popular_detail_tickers", lambda: [])
+    monkeypatch.setattr(app_module, "prewarm_screener_indexes", lambda refresh_fundamentals=False: None)
+    return app_module, now, builds
+
+
+def test_every_market_tick_rebuilds_the_snapshots(ticking_app):
+    app_module, now, builds = ticking_app
+    start, interval = now[0], app_module.PREWARM_INTERVAL_SECONDS
+    for tick in range(8):
+        now[0] = start + tick * interval
+        app_module.prewarm_market_snapshots()
+    assert len(builds) == 8
+
+
+def test_snapshot_another_worker_wrote_this_tick_is_reused(ticking_app):
+    app_module, now, builds = ticking_app
+    interval = app_module.PREWARM_INTERVAL_SECONDS
+    app_module.data_cache.set("snapshot", "stock_overview_data", [], ttl=2 * interval) # another worker's tick
+    now[0] += 3
+    app_module.prewarm_market_snapshots()
+    assert builds == []
+    now[0] += interval
+    app_module.prewarm_market_snapshots()
+    assert len(builds) == 1
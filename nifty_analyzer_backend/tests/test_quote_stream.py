@@ -0,0 +1,127 @@
+# test_quote_stream.py
+
+from data_sources import FakeQuoteSource
+from quote_stream import QuoteBroadcaster, STREAM_FIELDS, SIGNAL_FIELDS
+
+TICKERS = ["TCS.NS", "INFY.NS", "HDFCBANK.NS", "RELIANCE.NS", "ITC.NS"]
+
+
+class DrivenFeed:
+    """FakeQuoteSource polled only when a test asks, so the broadcaster's own loop thread sees no quotes."""
+
+    def __init__(self, **params):
+        self.source = FakeQuoteSource(TICKERS, **params)
+        self._pending = []
+
+    def poll_fn(self):
+        return self._pending.pop(0) if self._pending else []
+
+    def step(self, broadcaster):
+        rows = self.source.quotes()
+        self._pending.append([dict(row) for row in rows])
+        return broadcaster.poll_once(), {row["ticker"]: row for row in rows}
+
+
+def make_broadcaster(feed, **params):
+    return QuoteBroadcaster(feed.poll_fn, interval=3600, **params)
+
+
+def subscribe(broadcaster, tickers=None):
+    # The loop thread is stopped (which also resets its state), so call this before the first step.
+    subscription = broadcaster.subscribe(tickers)
+    broadcaster.stop()
+    thread = broadcaster._thread
+    if thread is not None: thread.join(timeout=5)
+    return subscription, subscription.events(heartbeat=0.01)
+
+
+def next_event(events):
+    # Skips heartbeats, which only mean the queue was empty.
+    for event, data in events:
+        if event != "heartbeat": return event, data
+
+
+def test_first_poll_sends_every_field_then_deltas_carry_only_changes():
+    feed = DrivenFeed(move_fraction=0.5, flip_probability=0.0, seed=1)
+    broadcaster = make_broadcaster(feed)
+    _, events = subscribe(broadcaster)
+    first, rows = feed.step(broadcaster)
+    assert sorted(d["ticker"] for d in first) == sorted(TICKERS)
+    assert all(set(d) == {"ticker", *STREAM_FIELDS, *SIGNAL_FIELDS} for d in first)
+    event, snapshot = next_event(events)
+    assert event == "snapshot" and {row["ticker"]: row["cmp"] for row in snapshot} == {t: rows[t]["cmp"] for t in TICKERS}
+    assert next_event(events) == ("delta", first)
+
+    for _ in range(5):
+        previous = rows
+        deltas, rows = feed.step(broadcaster)
+        expected = {t: {f: rows[t][f] for f in STREAM_FIELDS if rows[t][f] != previous[t][f]} for t in TICKERS}
+        assert {d["ticker"]: {f: v for f, v in d.items() if f != "ticker"} for d in deltas} == {t: c for t, c in expected.items() if c}
+        if deltas: assert next_event(events) == ("delta", deltas)
+
+
+def test_signal_flip_adds_signal_fields_and_ticker_filter_applies():
+    feed = DrivenFeed(move_fraction=1.0, flip_probability=1.0, seed=2)
+    broadcaster = make_broadcaster(feed)
+    _, events = subscribe(broadcaster, ["TCS.NS", "ITC.NS"])
+    feed.step(broadcaster)
+    assert sorted(row["ticker"] for row in next_event(events)[1]) == ["ITC.NS", "TCS.NS"]
+    next_event(events) # first full delta
+    deltas, rows = feed.step(broadcaster)
+    flipped = [d for d in deltas if "dmaSignal" in d]
+    assert flipped and all(d["dmaSignal"] == rows[d["ticker"]]["dmaSignal"] and "lastSignalDate" in d for d in flipped)
+    event, received = next_event(events)
+    assert event == "delta" and sorted(d["ticker"] for d in received) == ["ITC.NS", "TCS.NS"]
+
+
+def test_overflowing_subscriber_is_resynced_with_a_fresh_snapshot():
+    feed = DrivenFeed(move_fraction=1.0, seed=3)
+    broadcaster = make_broadcaster(feed, max_queue=2, max_resyncs=3)
+    subscription, events = subscribe(broadcaster)
+    assert next_event(events) == ("snapshot", [])
+    for _ in range(3): _, rows = feed.step(broadcaster) # third delta overflows the queue of two
+    assert broadcaster.stats["resyncs"] == 1 and subscription.overflows == 1
+    event, snapshot = next_event(events)
+    assert event == "snapshot" and {row["ticker"]: row["cmp"] for row in snapshot} == {t: rows[t]["cmp"] for t in TICKERS}
+    feed.step(broadcaster)
+    assert next_event(events)[0] == "delta"
+    assert subscription.overflows == 0 # caught up
+    assert broadcaster.subscriber_count() == 1
+
+
+def test_slow_consumer_is_dropped_after_max_resyncs():
+    feed = DrivenFeed(move_fraction=1.0, seed=4)
+    broadcaster = make_broadcaster(feed, max_queue=1, max_resyncs=2)
+    fast, fast_events = subscribe(broadcaster)
+    slow, slow_events = subscribe(broadcaster)
+    assert next_event(fast_events)[0] == next_event(slow_events)[0] == "snapshot"
+    for _ in range(6): # every second delta overflows the never-read queue of one; the third overflow drops it
+        feed.step(broadcaster)
+        assert next_event(fast_events)[0] == "delta"
+    assert broadcaster.stats["resyncs"] == 3 and broadcaster.stats["dropped"] == 1
+    assert broadcaster.subscriber_count() == 1 and fast.close_reason is None
+    assert next_event(slow_events) == ("close", {"reason": "slow consumer"})
+
+
+def test_subscribers_beyond_the_cap_are_rejected_until_a_slot_frees():
+    broadcaster = make_broadcaster(DrivenFeed(), max_subscribers=2)
+    _, first = subscribe(broadcaster)
+    subscribe(broadcaster)
+    assert broadcaster.subscribe() is None and broadcaster.stats["rejected"] == 1
+    next_event(first)
+    first.close() # client went away
+    assert broadcaster.subscriber_count() == 1
+    assert subscribe(broadcaster)[0] is not None
+
+
+def test_stream_endpoint_returns_503_when_slots_are_full(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.quote_broadcaster, "max_subscribers", 0)
+    response = app_module.app.test_client().get("/api/stream/quotes?tickers=TCS")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] and "error" in response.get_json()
+
+
+def test_stream_endpoint_returns_404_for_tickers_outside_the_universe(app_module):
+    response = app_module.app.test_client().get("/api/stream/quotes?tickers=TCS,IRCTC")
+    assert response.status_code == 404 and "IRCTC.NS" in response.get_json()["error"]
+    assert app_module.quote_broadcaster.subscriber_count() == 0
@@ -0,0 +1,57 @@
+# test_screener_endpoint.py
+
+import threading
+
+import pytest
+
+from data_sources import FakeDataSource
+
+
+class GatedSource(FakeDataSource):
+    """FakeDataSource whose info() calls wait until the test opens the gate."""
+
+    def __init__(self, **params):
+        super().__init__(latency=0, **params)
+        self.gate = threading.Event()
+        self.info_calls = 0
+
+    def info(self, ticker_symbol):
+        self.info_calls += 1
+        assert self.gate.wait(timeout=10)
+        return super().info(ticker_symbol)
+
+
+@pytest.fixture
+def screener_app(app_module, monkeypatch):
+    source = GatedSource()
+    monkeypatch.setattr(app_module, "data_source", source)
+    monkeypatch.setattr(app_module.history_loader, "source", source)
+    monkeypatch.setattr(app_module, "screener_indexes", {})
+    monkeypatch.setattr(app_module, "screener_fundamentals", {})
+    monkeypatch.setattr(app_module, "screener_fundamentals_pending", set())
+    yield app_module, source
+    source.gate.set()
+
+
+@pytest.mark.parametrize("limit", ["-2", "x"])
+def test_invalid_limit_is_rejected(screener_app, limit):
+    app_module, _ = screener_app
+    response = app_module.app.test_client().get(f"/api/screener?limit={limit}")
+    assert response.status_code == 400 and "error" in response.get_json()
+
+
+def test_fundamental_query_answers_at_once_and_fetches_in_the_background(screener_app):
+    app_module, source = screener_app
+    client = app_module.app.test_client()
+    payload = client.get("/api/screener?where=trailingPE>0&sort=-marketCap").get_json() # info() is still blocked
+    symbols = len(app_module.NIFTY50_TICKERS)
+    assert payload["fundamentalsPending"] and payload["fundamentalsMissing"] == symbols and payload["matched"] == 0
+    client.get("/api/screener?sort=-marketCap") # a second query does not start another fetch
+    assert len(app_module.screener_fundamentals_pending) == 1
+
+    fetcher = next(t for t in threading.enumerate() if t.name == f"screener-fundamentals-{payload['universe']}")
+    source.gate.set()
+    fetcher.join(timeout=10)
+    assert source.info_calls == symbols
+    payload = client.get("/api/screener?where=trailingPE>0&sort=-marketCap").get_json()
+    assert not payload["fundamentalsPending"] and payload["fundamentalsMissing"] == 0 and payload["matched"] > 0
@@ -3,7 +3,7 @@
 import React, { useState, useEffect, useMemo, useCallback } from 'react';
 import { Link } from 'react-router-dom';
 // Ensure getStockQuickUpdates is imported
-import { getStockOverviewData, getStockQuickUpdates } from '../services/apiService.js';
+import { getStockOverviewData, getStockQuickUpdates, subscribeToQuoteStream } from '../services/apiService.js';
 
 
 // --- Signal Configuration ---
@@ -102,6 +102,11 @@ const DashboardPage = () => {
                 dayChangePercent: update.dayChangePercent,
                 dayChangeAbs: update.dayChangeAbs,
                 volume: update.volume,
+                // Backend recomputes the DMA signal with today's price on every quick update
+                dmaSignal: update.dmaSignal || stock.dmaSignal,
+                lastSignalDate: update.dmaSignal ? update.lastSignalDate : stock.lastSignalDate,
+                smaShort: update.smaShort ?? stock.smaShort,
+                smaLong: update.smaLong ?? stock.smaLong,
               };
             }
             return stock; 
@@ -124,6 +129,37 @@ const DashboardPage = () => {
     fetchFullData(false); // Don't force client cache bypass on initial mount
   }, [fetchFullData]); // fetchData is memoized
 
+  // Live prices for the whole table over the quote stream; "Refresh Prices" still works if the stream is unavailable.
+  const hasStocks = allStocks.length > 0;
+  const [isStreamLive, setIsStreamLive] = useState(false);
+
+  useEffect(() => {
+    if (!hasStocks) return;
+    const closeStream = subscribeToQuoteStream(null, (eventType, rows) => {
+      setIsStreamLive(true);
+      const rowsByTicker = new Map(rows.filter(row => row && row.ticker).map(row => [row.ticker, row]));
+      setAllStocks(prevStocks => prevStocks.map(stock => {
+        const quote = rowsByTicker.get(stock.ticker);
+        if (!quote) return stock;
+        // Deltas only carry the fields that changed; anything missing keeps its previous value.
+        const pick = (field) => (quote[field] !== undefined ? quote[field] : stock[field]);
+        return {
+          ...stock,
+          cmp: pick('cmp'),
+          dayChangePercent: pick('dayChangePercent'),
+          dayChangeAbs: pick('dayChangeAbs'),
+          volume: pick('volume'),
+          dmaSignal: pick('dmaSignal') || stock.dmaSignal,
+          lastSignalDate: pick('lastSignalDate'),
+        };
+      }));
+    }, () => setIsStreamLive(false));
+    return () => {
+      if (closeStream) closeStream();
+      setIsStreamLive(false);
+    };
+  }, [hasStocks]);
+
   // Memoized unique signal types for the filter dropdown
   const uniqueSignalTypesForFilter = useMemo(() => {
     if (!allStocks || allStocks.length === 0) return [];
@@ -259,7 +295,7 @@ const DashboardPage = () => {
           className="refresh-button quick-refresh-button"
           disabled={isQuickLoading || isFullLoading} // Disable if any load is in progress
         >
-          {isQuickLoading ? 'Updating Prices...' : 'Refresh Prices'}
+          {isQuickLoading ? 'Updating Prices...' : (isStreamLive ? 'Refresh Prices (live)' : 'Refresh Prices')}
         </button>
         <button 
           onClick={() => fetchFullData(true)} // Pass true to bypass client cache
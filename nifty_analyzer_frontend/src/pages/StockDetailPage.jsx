@@ -1,7 +1,7 @@
 // src/pages/StockDetailPage.jsx
 import React, { useState, useEffect, useCallback } from 'react';
 import { useParams, Link as RouterLink } from 'react-router-dom';
-import { getStockDetailData, getSingleStockQuickInfo } from '../services/apiService.js';
+import { getStockDetailData, getSingleStockQuickInfo, subscribeToQuoteStream } from '../services/apiService.js';
 
 // Import utilities from your utils file
 import {
@@ -90,6 +90,7 @@ const StockDetailPage = () => {
     // **** ADD NEW STATE for quick price updates ****
     const [isPriceUpdating, setIsPriceUpdating] = useState(false);
     const [error, setError] = useState(null);
+    const [useStreamUpdates, setUseStreamUpdates] = useState(true); // Falls back to polling when false
     
     const bodyHasDarkMode = document.body.classList.contains('dark-mode');
 
@@ -100,14 +101,22 @@ const StockDetailPage = () => {
         setIsLoading(true); // This is for the main page load
         setError(null);
         try {
-            const data = await getStockDetailData(tickerSymbol, forceBackendRefresh);
+            // First paint needs only the fast sections; financial statements follow in a second request.
+            const data = await getStockDetailData(tickerSymbol, forceBackendRefresh, ['info', 'history', 'signals']);
             setStockData(data);
         } catch (err) {
             setError(err.message || `Failed to fetch data for ${tickerSymbol}. Is the backend running?`);
             setStockData(null);
+            return;
         } finally {
             setIsLoading(false);
         }
+        try {
+            const { financialStatements } = await getStockDetailData(tickerSymbol, forceBackendRefresh, ['financials']);
+            setStockData(prevData => (prevData ? { ...prevData, financialStatements } : prevData));
+        } catch (err) {
+            console.warn(`Financial statements for ${tickerSymbol} could not be loaded:`, err.message);
+        }
     }, [tickerSymbol]);
 
     // **** ADD NEW FUNCTION for fetching quick price updates ****
@@ -151,11 +160,43 @@ const StockDetailPage = () => {
         fetchInitialData(false);
     }, [fetchInitialData]); // fetchInitialData is memoized and depends on tickerSymbol
 
-    // **** ADD NEW useEffect for periodic price updates ****
+    // Live price updates: pushed over the quote stream, falling back to polling if it's unavailable
+    const hasStockData = Boolean(stockData);
+
+    useEffect(() => {
+        if (!hasStockData || isLoading || error || !useStreamUpdates) return;
+        const closeStream = subscribeToQuoteStream([tickerSymbol], (eventType, rows) => {
+            const quote = rows.find(row => row.ticker === tickerSymbol);
+            if (!quote) return;
+            setStockData(prevData => {
+                if (!prevData) return null;
+                // Deltas only carry the fields that changed; anything missing keeps its previous value.
+                const pick = (field, previous) => (quote[field] !== undefined ? quote[field] : previous);
+                return {
+                    ...prevData,
+                    currentMarketData: {
+                        ...prevData.currentMarketData,
+                        cmp: pick('cmp', prevData.currentMarketData.cmp),
+                        dayChangeAbs: pick('dayChangeAbs', prevData.currentMarketData.dayChangeAbs),
+                        dayChangePercent: pick('dayChangePercent', prevData.currentMarketData.dayChangePercent),
+                        volume: pick('volume', prevData.currentMarketData.volume),
+                    },
+                    currentDma: {
+                        ...prevData.currentDma,
+                        signal: pick('dmaSignal', prevData.currentDma.signal),
+                        lastSignalDate: pick('lastSignalDate', prevData.currentDma.lastSignalDate),
+                    },
+                };
+            });
+        }, () => setUseStreamUpdates(false));
+        if (!closeStream) setUseStreamUpdates(false);
+        return () => { if (closeStream) closeStream(); };
+    }, [tickerSymbol, hasStockData, isLoading, error, useStreamUpdates]);
+
     useEffect(() => {
-        if (!stockData || isLoading || error) {
+        if (!stockData || isLoading || error || useStreamUpdates) {
             // Don't start interval if initial data isn't loaded, 
-            // main loading is in progress, or there's a page error
+            // main loading is in progress, there's a page error, or the stream is delivering updates
             return;
         }
 
@@ -164,7 +205,7 @@ const StockDetailPage = () => {
         }, 10000); // Update every 10 seconds UPDATE TIMER in millisecond
 
         return () => clearInterval(intervalId); // Cleanup interval
-    }, [stockData, isLoading, error, fetchPriceUpdate]); // Dependencies
+    }, [stockData, isLoading, error, useStreamUpdates, fetchPriceUpdate]); // Dependencies
 
 
     // Helper to display key-value pairs safely
@@ -200,7 +241,7 @@ const StockDetailPage = () => {
                         <p style={{ margin: 0, color: '#495057', fontSize: '0.9em' }}>{info.sector || 'N/A'} {info.industry && ` - ${info.industry}`}</p>
                     </div>
                     <button 
-                        onClick={() => fetchInitialData(true)} 
+                        onClick={() => fetchInitialData('all')} 
                         className="refresh-button" 
                         disabled={isLoading || isPriceUpdating} 
                         style={{ minWidth: '100px', whiteSpace: 'nowrap' }}
@@ -69,12 +69,14 @@ export const getStockQuickUpdates = async () => {
 
 
 // Data for the individual stock detail page
-export const getStockDetailData = async (tickerSymbol, forceBackendRefresh = false) => {
+// sections (optional): any of 'info', 'history', 'signals', 'financials'; omitted means the full payload.
+export const getStockDetailData = async (tickerSymbol, forceBackendRefresh = false, sections = null) => {
   try {
-    const url = forceBackendRefresh 
-                ? `/stock_detail/${tickerSymbol}?refresh=true` 
-                : `/stock_detail/${tickerSymbol}`;
-    const response = await apiClient.get(url);
+    const params = {};
+    // true re-fetches prices and history; 'all' also re-fetches company info and financial statements.
+    if (forceBackendRefresh) params.refresh = forceBackendRefresh === 'all' ? 'all' : 'true';
+    if (sections && sections.length) params.sections = sections.join(',');
+    const response = await apiClient.get(`/stock_detail/${tickerSymbol}`, { params });
     return response.data;
   } catch (error) {
     console.error(`Error fetching stock detail data for ${tickerSymbol}:`, error);
@@ -100,6 +102,23 @@ export const getSingleStockQuickInfo = async (tickerSymbol) => {
     }
   };
   
+// --- Live quote deltas over Server-Sent Events ---
+// onMessage receives (eventType, rows): 'snapshot' rows are full quotes, 'delta' rows carry only changed fields.
+// Returns a function that closes the stream. onError fires if the stream can't be (re)established.
+export const subscribeToQuoteStream = (tickers, onMessage, onError) => {
+  if (typeof window === 'undefined' || !window.EventSource) return null;
+  const query = tickers && tickers.length ? `?tickers=${encodeURIComponent(tickers.join(','))}` : '';
+  const source = new EventSource(`${API_BASE_URL}/stream/quotes${query}`);
+  ['snapshot', 'delta'].forEach(eventType => {
+    source.addEventListener(eventType, (event) => onMessage(eventType, JSON.parse(event.data)));
+  });
+  source.onerror = () => {
+    // EventSource reconnects by itself; only report once it has given up.
+    if (source.readyState === EventSource.CLOSED && onError) onError();
+  };
+  return () => source.close();
+};
+
 // Nifty 50 List
 export const getNifty50List = async () => {
   try {